@@ -0,0 +1,259 @@
+"""Measure the cold start of the integration, from the import to the first entity states.
+
+The import time is taken in a fresh interpreter with -X importtime, after the
+Home Assistant modules every installation loads anyway. The setup runs in a
+minimal in-process Home Assistant against benchmarks/fake_server.py, which runs
+in its own thread, and is broken down into the phases of async_setup_entry and
+the platform forwarding until every sensor and binary_sensor has a state. Run
+from the repository root:
+
+    python -m benchmarks.cold_start --cars 100 --runs 5
+    python -m benchmarks.cold_start --cars 1000 --latency 0.05 --expired-token
+"""
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PORT = 8097
+
+# The base URIs are read when const.py is imported
+os.environ["SMARTEQ_REST_API_BASE"] = f"http://127.0.0.1:{PORT}"
+os.environ["SMARTEQ_LOGIN_BASE_URI"] = f"http://127.0.0.1:{PORT}"
+
+from homeassistant import bootstrap, config_entries, core, loader  # noqa: E402
+from homeassistant.const import EVENT_STATE_CHANGED  # noqa: E402
+
+import custom_components.smarteqconnect as integration  # noqa: E402
+from benchmarks.fake_server import FakeSmartBackend  # noqa: E402
+from custom_components.smarteqconnect import binary_sensor, sensor  # noqa: E402
+from custom_components.smarteqconnect.api import API  # noqa: E402
+from custom_components.smarteqconnect.client import Client  # noqa: E402
+from custom_components.smarteqconnect.const import (  # noqa: E402
+    BINARY_SENSORS,
+    DEFAULT_TOKEN_PATH,
+    DOMAIN,
+    SENSORS,
+)
+from custom_components.smarteqconnect.oauth import Oauth  # noqa: E402
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded by Home Assistant before any custom integration, not part of its cost
+PRELOADED_MODULES = [
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.entity",
+    "homeassistant.helpers.restore_state",
+    "homeassistant.components.sensor",
+    "homeassistant.components.binary_sensor",
+    "aiohttp",
+]
+INTEGRATION_MODULES = [
+    "custom_components.smarteqconnect",
+    "custom_components.smarteqconnect.sensor",
+    "custom_components.smarteqconnect.binary_sensor",
+]
+
+# label, owner, attribute of the instrumented coroutine functions and which of their calls count:
+# all, the first or the ones started during async_setup_entry, the later belong to the refresh schedule
+PHASES = [
+    ("async_setup_entry", integration, "async_setup_entry", "all"),
+    ("token", Oauth, "async_get_cached_token", "first"),
+    ("users/current", API, "get_user_info", "all"),
+    ("init-data", Client, "get_car_details_init", "all"),
+    ("first update", Client, "update_car", "setup"),
+    ("on_dataload_complete", integration.SmartEQContext, "on_dataload_complete", "all"),
+    ("sensor platform", sensor, "async_setup_entry", "all"),
+    ("binary_sensor platform", binary_sensor, "async_setup_entry", "all"),
+]
+
+
+def measure_import(runs: int) -> tuple:
+    """Return the median import time of the integration and the self time of its modules in seconds."""
+    code = "; ".join(f"import {module}" for module in PRELOADED_MODULES + INTEGRATION_MODULES)
+    totals, modules = [], {}
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=REPOSITORY,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            self_time, cumulative, name = line[len("import time:") :].split("|")
+            if not self_time.strip().isdigit():
+                continue
+            module = name.strip()
+            if module.startswith("custom_components.smarteqconnect") or module == "custom_components":
+                modules.setdefault(module, []).append(int(self_time) / 1e6)
+                # Top level imports of the integration include the dependencies they pull in
+                if len(name) - len(name.lstrip()) == 1:
+                    total += int(cumulative) / 1e6
+        totals.append(total)
+
+    return statistics.median(totals), {module: statistics.median(times) for module, times in modules.items()}
+
+
+class PhaseRecorder:
+    """Record the first start and the last end of the instrumented coroutine functions."""
+
+    def __init__(self) -> None:
+        self.started = 0.0
+        self.spans = {}
+        self._originals = []
+
+    def instrument(self) -> None:
+        for label, owner, attribute, calls in PHASES:
+            original = getattr(owner, attribute)
+            self._originals.append((owner, attribute, original))
+            setattr(owner, attribute, self._wrap(label, original, calls))
+
+    def restore(self) -> None:
+        for owner, attribute, original in self._originals:
+            setattr(owner, attribute, original)
+        self._originals.clear()
+
+    def mark(self, label: str, start: float, end: float = None) -> None:
+        start -= self.started
+        end = start if end is None else end - self.started
+        first, last = self.spans.get(label, (start, end))
+        self.spans[label] = (min(first, start), max(last, end))
+
+    def _wrap(self, label: str, original, calls: str):
+        @functools.wraps(original)
+        async def timed(*args, **kwargs):
+            if (calls == "first" and label in self.spans) or (calls == "setup" and "async_setup_entry" in self.spans):
+                return await original(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.mark(label, start, time.perf_counter())
+
+        return timed
+
+
+def start_backend(backend: FakeSmartBackend) -> tuple:
+    """Run the fake server in a thread with its own event loop."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runner = asyncio.run_coroutine_threadsafe(backend.start(port=PORT), loop).result()
+    return loop, runner
+
+
+def stop_backend(loop, runner) -> None:
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+async def measure_setup(backend: FakeSmartBackend, expired_token: bool) -> dict:
+    """Set up one config entry in a fresh Home Assistant, return the phase spans in seconds."""
+    expected_states = len(backend.vins) * (len(SENSORS) + len(BINARY_SENSORS))
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        os.makedirs(os.path.join(config_dir, "custom_components"))
+        os.symlink(
+            os.path.join(REPOSITORY, "custom_components", DOMAIN),
+            os.path.join(config_dir, "custom_components", DOMAIN),
+        )
+        token = backend.issue_token()
+        token["expires_at"] = 0 if expired_token else time.time() + token["expires_in"]
+        with open(os.path.join(config_dir, DEFAULT_TOKEN_PATH), "w") as token_file:
+            json.dump(token, token_file)
+
+        hass = core.HomeAssistant(config_dir)
+        hass.config.skip_pip = True
+        loader.async_setup(hass)
+        await bootstrap.load_registries(hass)
+        hass.config_entries = config_entries.ConfigEntries(hass, {})
+        await hass.config_entries.async_initialize()
+
+        recorder = PhaseRecorder()
+        all_states = asyncio.Event()
+        entity_ids = set()
+
+        @core.callback
+        def state_changed(event):
+            entity_id = event.data["entity_id"]
+            if entity_id.startswith(("sensor.", "binary_sensor.")) and entity_id not in entity_ids:
+                entity_ids.add(entity_id)
+                if len(entity_ids) == 1:
+                    recorder.mark("first entity state", time.perf_counter())
+                if len(entity_ids) == expected_states:
+                    recorder.mark("all entity states", time.perf_counter())
+                    all_states.set()
+
+        hass.bus.async_listen(EVENT_STATE_CHANGED, state_changed)
+        entry_args = {"version": 1, "domain": DOMAIN, "title": "cold start", "data": {"region": "Europe"}}
+        # Required since Home Assistant 2024.1, unknown before
+        if "minor_version" in inspect.signature(config_entries.ConfigEntry).parameters:
+            entry_args["minor_version"] = 1
+        entry = config_entries.ConfigEntry(**entry_args, source="user", options={})
+
+        recorder.instrument()
+        try:
+            recorder.started = time.perf_counter()
+            await hass.config_entries.async_add(entry)
+            await asyncio.wait_for(all_states.wait(), timeout=120)
+        finally:
+            recorder.restore()
+            await hass.config_entries.async_unload(entry.entry_id)
+            await hass.async_stop(force=True)
+
+    return recorder.spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cars", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake server adds to every response")
+    parser.add_argument("--expired-token", action="store_true", help="start with an expired token, adds a refresh")
+    args = parser.parse_args()
+
+    # Silence the warning about the untested custom integration
+    logging.getLogger("homeassistant.loader").setLevel(logging.ERROR)
+
+    import_total, import_modules = measure_import(args.runs)
+    print(f"Import, median of {args.runs} runs, after the Home Assistant core modules")
+    for module, seconds in sorted(import_modules.items(), key=lambda item: -item[1]):
+        print(f"  {module:<50} {seconds * 1000:9.2f} ms self")
+    print(f"  {'total with dependencies':<50} {import_total * 1000:9.2f} ms")
+
+    backend = FakeSmartBackend(cars=args.cars, latency=args.latency)
+    backend_loop, runner = start_backend(backend)
+    try:
+        runs = [asyncio.run(measure_setup(backend, args.expired_token)) for _ in range(args.runs)]
+    finally:
+        stop_backend(backend_loop, runner)
+
+    print(f"\nSetup with {args.cars} cars, median of {args.runs} runs, relative to the config entry setup start")
+    print(f"  {'phase':<50} {'start':>9}    {'duration':>9}")
+    for label in sorted(runs[0], key=lambda label: runs[0][label][0]):
+        start = statistics.median(spans[label][0] for spans in runs)
+        duration = statistics.median(spans[label][1] - spans[label][0] for spans in runs)
+        print(f"  {label:<50} {start * 1000:9.2f} ms {duration * 1000:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Benchmark the decoding of vehicle payloads with every available JSON backend.
+
+Run from the repository root:
+
+    python -m benchmarks.decode
+"""
+import json
+import timeit
+
+from benchmarks.fixtures import refresh_data_payload
+from custom_components.smarteqconnect.models import (
+    DECODERS,
+    JSON_BACKEND,
+    InitData,
+    RefreshData,
+    UserInfo,
+)
+
+
+def user_info_payload(cars: int = 10) -> bytes:
+    return json.dumps(
+        {"authorizations": [{"fin": f"WME{index:014d}", "licensePlate": f"HH-EQ {index}"} for index in range(cars)]}
+    ).encode()
+
+
+def init_data_payload() -> bytes:
+    return json.dumps(
+        {"vehicleData": {"salesRelatedInformation": {"baumuster": {"baumusterDescription": "smart EQ fortwo"}}}}
+    ).encode()
+
+
+def main(number: int = 20000):
+    payloads = {
+        "refresh-data": (refresh_data_payload(extra_fields=60), RefreshData),
+        "init-data": (init_data_payload(), InitData),
+        "users/current": (user_info_payload(), UserInfo),
+    }
+
+    print(f"default backend: {JSON_BACKEND}")
+    for name, (payload, model) in payloads.items():
+        for backend, decode in DECODERS.items():
+            seconds = min(timeit.repeat(lambda: decode(payload, model), number=number, repeat=3))
+            print(f"{name:<15} {backend:<8} {seconds / number * 1e6:8.2f} us/decode ({len(payload)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Local stand-in for the smart EQ API and the identity endpoints used by Oauth.
+
+The server generates a synthetic fleet and answers the requests of the
+integration with payloads shaped like the real ones. Latency, server errors,
+429s and the token lifetime are configurable, so the integration can be load
+tested at any fleet size. Run from the repository root:
+
+    python -m benchmarks.fake_server --cars 1000 --latency 0.05 --error-rate 0.01
+
+and point the integration at it before Home Assistant starts:
+
+    export SMARTEQ_REST_API_BASE=http://127.0.0.1:8099
+    export SMARTEQ_LOGIN_BASE_URI=http://127.0.0.1:8099
+
+An access token the server did not issue, or an expired one, is answered with
+a 401. Every refresh token is accepted, so a cached token of a real account
+just gets refreshed on the first request.
+"""
+import argparse
+import asyncio
+import json
+import random
+import secrets
+import time
+
+from aiohttp import web
+
+from benchmarks.fixtures import refresh_data_sections
+
+DEFAULT_PORT = 8099
+
+
+class FakeSmartBackend:
+    """A synthetic fleet behind the API and identity endpoints."""
+
+    def __init__(
+        self,
+        cars: int = 10,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        token_lifetime: int = 7200,
+        change_rate: float = 0.5,
+        seed: int = 0,
+    ) -> None:
+        self.vins = [f"WME4533911F{index:06d}" for index in range(cars)]
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.token_lifetime = token_lifetime
+        self.change_rate = change_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._tokens = {}
+        self._codes = set()
+        self._state = {vin: self._initial_state(index) for index, vin in enumerate(self.vins)}
+        # Per option, only advanced when the value changes, so unchanged polls return identical bodies
+        started = int(time.time())
+        self._timestamps = {vin: dict.fromkeys(state, started) for vin, state in self._state.items()}
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._fault_middleware])
+        app.router.add_get("/seqc/v0/users/current", self._users_current)
+        app.router.add_get("/seqc/v0/vehicles/{vin}/init-data", self._init_data)
+        app.router.add_get("/seqc/v0/vehicles/{vin}/refresh-data", self._refresh_data)
+        app.router.add_post("/seqc/v0/vehicles/{vin}/precond/start", self._precond_start)
+        app.router.add_get("/v1/vehicle/{vin}/capabilities/commands", self._capabilities)
+        app.router.add_get("/as/authorization.oauth2", self._authorization)
+        app.router.add_get("/ciam/auth/login", self._login_page)
+        app.router.add_post("/ciam/auth/login/user", self._login_user)
+        app.router.add_route("*", "/ciam/auth/login/otp", self._login_otp)
+        app.router.add_post("/as/resume/{resume}", self._resume)
+        app.router.add_post("/as/token.oauth2", self._token)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> web.AppRunner:
+        """Start the server in the running loop, the caller cleans up the returned runner."""
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    def issue_token(self) -> dict:
+        access_token = secrets.token_urlsafe(32)
+        self._tokens[access_token] = time.time() + self.token_lifetime
+        return {
+            "access_token": access_token,
+            "refresh_token": secrets.token_urlsafe(32),
+            "id_token": secrets.token_urlsafe(32),
+            "token_type": "Bearer",
+            "expires_in": self.token_lifetime,
+        }
+
+    @web.middleware
+    async def _fault_middleware(self, request: web.Request, handler):
+        self.requests += 1
+        if self.latency or self.latency_jitter:
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.latency_jitter))
+
+        if self.rate_limit_rate and self._random.random() < self.rate_limit_rate:
+            return web.json_response({"error": "too many requests"}, status=429, headers={"Retry-After": "30"})
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.json_response({"error": "internal server error"}, status=500)
+
+        if request.path.startswith(("/seqc/", "/v1/")):
+            authorization = request.headers.get("Authorization", "")
+            expires_at = self._tokens.get(authorization[len("Bearer ") :])
+            if expires_at is None or expires_at < time.time():
+                return web.json_response({"error": "invalid_token"}, status=401)
+            if "vin" in request.match_info and request.match_info["vin"] not in self._state:
+                return web.json_response({"error": "unknown vehicle"}, status=404)
+
+        return await handler(request)
+
+    def _initial_state(self, index: int) -> dict:
+        return {
+            "odo": 1000 + index * 37 % 40000,
+            "ecoscoretotal": self._random.randint(40, 100),
+            "ecoScoreFluentDriving": self._random.randint(40, 100),
+            "ecoScoreSpeed": self._random.randint(40, 100),
+            "serviceintervaldays": self._random.randint(1, 365),
+            "serviceintervaldistance": self._random.randint(100, 20000),
+            "tirewarningsrdk": "false",
+            "rangeelectric": self._random.randint(20, 160),
+            "electricconsumptionstart": round(self._random.uniform(10, 20), 1),
+            "soc": self._random.randint(5, 100),
+            "chargingactive": "false",
+            "chargingstatus": 3,
+            "precondNow": "false",
+        }
+
+    def _advance(self, vin: str) -> None:
+        """Drive or charge a car a little, so polls see changing values."""
+        if self._random.random() >= self.change_rate:
+            return
+
+        state = self._state[vin]
+        before = dict(state)
+        if state["soc"] < 30 or state["chargingactive"] == "true":
+            state["chargingactive"] = "true" if state["soc"] < 100 else "false"
+            state["chargingstatus"] = 0 if state["chargingactive"] == "true" else 3
+            state["soc"] = min(100, state["soc"] + 1)
+        else:
+            state["odo"] += 1
+            state["soc"] -= 1
+        state["rangeelectric"] = state["soc"] * 160 // 100
+        self._touch(vin, [option for option, value in state.items() if before[option] != value])
+
+    def _touch(self, vin: str, options) -> None:
+        now = int(time.time())
+        for option in options:
+            self._timestamps[vin][option] = now
+
+    async def _users_current(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"authorizations": [{"fin": vin, "licensePlate": f"HH-EQ {index}"} for index, vin in enumerate(self.vins)]}
+        )
+
+    async def _init_data(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "vehicleData": {
+                    "fin": request.match_info["vin"],
+                    "salesRelatedInformation": {"baumuster": {"baumusterDescription": "smart EQ fortwo coupé"}},
+                }
+            }
+        )
+
+    async def _refresh_data(self, request: web.Request) -> web.Response:
+        vin = request.match_info["vin"]
+        self._advance(vin)
+
+        sections = refresh_data_sections(self._state[vin], self._timestamps[vin])
+        return web.Response(body=json.dumps(sections).encode(), content_type="application/json")
+
+    async def _precond_start(self, request: web.Request) -> web.Response:
+        vin = request.match_info["vin"]
+        if self._state[vin]["precondNow"] != "true":
+            self._state[vin]["precondNow"] = "true"
+            self._touch(vin, ["precondNow"])
+        return web.json_response({})
+
+    async def _capabilities(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"commands": [{"commandName": "PRECOND_START", "isAvailable": True, "parameters": []}]}
+        )
+
+    async def _authorization(self, request: web.Request) -> web.Response:
+        raise web.HTTPFound(f"/ciam/auth/login?resume=/as/resume/{secrets.token_hex(8)}")
+
+    async def _login_page(self, request: web.Request) -> web.Response:
+        return web.Response(text="<html><body>login</body></html>", content_type="text/html")
+
+    async def _login_user(self, request: web.Request) -> web.Response:
+        return web.json_response({"result": "GO_TO_LOGIN_OTP"})
+
+    async def _login_otp(self, request: web.Request) -> web.Response:
+        if request.method == "PUT":
+            return web.json_response({"isEmail": True, "isValidUsername": True})
+        return web.json_response({"result": "RESUME2OIDCP", "token": secrets.token_urlsafe(16)})
+
+    async def _resume(self, request: web.Request) -> web.Response:
+        code = secrets.token_urlsafe(16)
+        self._codes.add(code)
+        raise web.HTTPFound(f"https://oneapp.microservice.smart.mercedes-benz.com?code={code}")
+
+    async def _token(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        grant_type = form.get("grant_type")
+        if grant_type == "refresh_token" and form.get("refresh_token"):
+            return web.json_response(self.issue_token())
+        if grant_type == "authorization_code" and form.get("code") in self._codes:
+            self._codes.discard(form["code"])
+            return web.json_response(self.issue_token())
+        return web.json_response({"error": "invalid_grant"}, status=400)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cars", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="up to this many seconds on top")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--token-lifetime", type=int, default=7200, help="seconds an issued access token is valid")
+    parser.add_argument("--change-rate", type=float, default=0.5, help="share of polls with changed car values")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    backend = FakeSmartBackend(
+        cars=args.cars,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        token_lifetime=args.token_lifetime,
+        change_rate=args.change_rate,
+        seed=args.seed,
+    )
+    print(f"Fake smart EQ backend with {args.cars} cars on http://{args.host}:{args.port}")
+    web.run_app(backend.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Payloads and a stand-in Home Assistant shared by the benchmarks and the fake server."""
+import json
+import os
+import types
+
+from custom_components.smarteqconnect.car import FIELD_MAPPINGS
+
+BASE_TIMESTAMP = 1700000000
+
+
+def fake_hass(config_dir: str = "") -> types.SimpleNamespace:
+    """Return the parts of hass the Client uses, config paths resolve into config_dir."""
+    return types.SimpleNamespace(
+        config=types.SimpleNamespace(path=lambda *parts: os.path.join(config_dir, *parts), units=None),
+    )
+
+
+def refresh_data_sections(values: dict, timestamps: dict, extra_fields: int = 0) -> dict:
+    """Return the sections of a refresh-data body with every mapped option, shaped like the real one.
+
+    values and timestamps are keyed by option, extra_fields unused options pad the status section.
+    """
+    sections = {}
+    for option, mapping in FIELD_MAPPINGS.items():
+        data = sections.setdefault(mapping.section, {"data": {}})["data"]
+        data[option] = {"value": values[option], "status": 0, "ts": timestamps[option]}
+
+    status = sections.setdefault("status", {"data": {}})["data"]
+    for index in range(extra_fields):
+        status[f"unused{index}"] = {"value": "x", "status": 4, "ts": 0}
+    return sections
+
+
+def refresh_data_payload(seed: int = 1, extra_fields: int = 0) -> bytes:
+    """Return a refresh-data body with synthetic values, every seed gives other values."""
+    values = {
+        option: ("true" if seed % 2 else "false") if mapping.converter is not None else seed
+        for option, mapping in FIELD_MAPPINGS.items()
+    }
+    timestamps = dict.fromkeys(FIELD_MAPPINGS, BASE_TIMESTAMP + seed)
+    return json.dumps(refresh_data_sections(values, timestamps, extra_fields)).encode()
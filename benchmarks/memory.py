@@ -0,0 +1,44 @@
+"""Measure the memory held by a parsed fleet and the allocations of a poll cycle.
+
+Run from the repository root:
+
+    python -m benchmarks.memory
+"""
+import tracemalloc
+
+from benchmarks.fixtures import fake_hass, refresh_data_payload
+from custom_components.smarteqconnect.car import Car
+from custom_components.smarteqconnect.client import Client
+from custom_components.smarteqconnect.models import RefreshData, decode
+
+
+def main(fleet_sizes=(1, 10, 100, 1000)):
+    client = Client(hass=fake_hass())
+    first, second = (decode(refresh_data_payload(seed), RefreshData) for seed in (1, 2))
+
+    for size in fleet_sizes:
+        tracemalloc.start()
+        cars = []
+        for index in range(size):
+            car = Car()
+            car.finorvin = f"WME{index:014d}"
+            client._parse_car_detail(car, first)
+            cars.append(car)
+        fleet_bytes, _ = tracemalloc.get_traced_memory()
+
+        # A second poll with changed values, only allocations of the update are counted
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        for car in cars:
+            client._parse_car_detail(car, second)
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(
+            f"{size:>5} cars: {fleet_bytes / size:8.0f} bytes/car held, "
+            f"{(after - before) / size:6.0f} bytes/car retained and {(peak - before) / size:6.0f} bytes/car peak per poll"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Replay a recorded cassette through the client and time the poll cycles.
+
+Record a cassette by setting CASSETTE_RECORD_PATH in const.py, then run from
+the repository root:
+
+    python -m benchmarks.replay path/to/cassette.jsonl --cycles 20 --latency-scale 0
+    python -m benchmarks.replay path/to/cassette.jsonl --profile
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+import time
+
+from benchmarks.fixtures import fake_hass
+from custom_components.smarteqconnect.car import Car
+from custom_components.smarteqconnect.cassette import ReplaySession
+from custom_components.smarteqconnect.client import Client
+from custom_components.smarteqconnect.const import DEFAULT_TOKEN_PATH
+
+
+async def replay(cassette: str, cycles: int, latency_scale: float, profiler=None):
+    with tempfile.TemporaryDirectory() as config_dir:
+        # A valid token, the recorded token requests are only replayed after a 401
+        with open(os.path.join(config_dir, DEFAULT_TOKEN_PATH), "w") as token_file:
+            json.dump(
+                {"access_token": "replay", "refresh_token": "replay", "expires_at": time.time() + 3600}, token_file
+            )
+
+        hass = fake_hass(config_dir)
+        session = ReplaySession.from_file(cassette, latency_scale=latency_scale)
+        client = Client(hass=hass, session=session)
+
+        started = time.perf_counter()
+        for authorization in (await client.api.get_user_info()).authorizations:
+            car = Car()
+            car.finorvin = authorization.fin
+            client.add_car(car)
+        await asyncio.gather(*[client.get_car_details_init(car) for car in client.cars.values()])
+        print(f"setup: {len(client.cars)} cars in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        if profiler is not None:
+            profiler.enable()
+        timings = []
+        for _ in range(cycles):
+            started = time.perf_counter()
+            await client.update()
+            timings.append(time.perf_counter() - started)
+        if profiler is not None:
+            profiler.disable()
+
+        timings.sort()
+        print(
+            f"update: {cycles} cycles, median {timings[len(timings) // 2] * 1000:.2f} ms, "
+            f"max {timings[-1] * 1000:.2f} ms, {client.skipped_updates} unchanged payloads skipped, "
+            f"{session.requests} requests replayed"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cassette")
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="0 replays without the recorded latency")
+    parser.add_argument("--profile", action="store_true", help="profile the update cycles with cProfile")
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    asyncio.run(replay(args.cassette, args.cycles, args.latency_scale, profiler))
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
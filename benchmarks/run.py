@@ -0,0 +1,241 @@
+"""Micro-benchmarks of the hot paths, compared against a stored baseline.
+
+Every benchmark runs once per fleet size and reports the time of one pass over
+the whole fleet. The run fails with exit code 1 if a benchmark got slower than
+its baseline by more than the tolerance. Baselines are machine specific, store
+them again after a change of the machine or the Python version. Run from the
+repository root:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 1 10 --filter parse
+    python -m benchmarks.run --save-baseline
+"""
+import argparse
+import asyncio
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import sys
+import timeit
+import types
+
+from benchmarks.fixtures import fake_hass, refresh_data_payload
+from custom_components.smarteqconnect import SmartEQEntity
+from custom_components.smarteqconnect.binary_sensor import SmartEQBinarySensor
+from custom_components.smarteqconnect.car import Car
+from custom_components.smarteqconnect.client import Client
+from custom_components.smarteqconnect.const import BINARY_SENSORS, SENSORS
+from custom_components.smarteqconnect.models import RefreshData, decode
+from custom_components.smarteqconnect.oauth import Oauth
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SIZES = (1, 10, 100, 1000)
+DEFAULT_TOLERANCE = 0.25
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Register a benchmark, the function builds the fixture and returns one pass over the fleet."""
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def make_fleet(size: int):
+    hass = fake_hass()
+    client = Client(hass=hass)
+    detail = decode(refresh_data_payload(1), RefreshData)
+    for index in range(size):
+        car = Car()
+        car.finorvin = f"WME4533911F{index:06d}"
+        car.licenseplate = f"HH-EQ {index}"
+        client._parse_car_detail(car, detail)
+        client.add_car(car)
+    return hass, client
+
+
+def make_entities(size: int, entity_class, configs):
+    hass, client = make_fleet(size)
+    data = types.SimpleNamespace(client=client)
+    entities = [
+        entity_class(hass=hass, data=data, internal_name=key, sensor_config=config, vin=vin)
+        for vin in client.cars
+        for key, config in configs.items()
+    ]
+    return client, entities
+
+
+@benchmark("parse_car_detail")
+def bench_parse_car_detail(size: int):
+    _, client = make_fleet(size)
+    details = itertools.cycle([decode(refresh_data_payload(seed), RefreshData) for seed in (2, 3)])
+    cars = list(client.cars.values())
+
+    def run():
+        detail = next(details)
+        for car in cars:
+            client._parse_car_detail(car, detail)
+
+    return run
+
+
+class StubAPI:
+    """Answer get_car_details_raw without a network, every second poll of a car is unchanged."""
+
+    def __init__(self):
+        self._payloads = [refresh_data_payload(seed) for seed in (2, 2, 3, 3)]
+        self._polls = {}
+
+    async def get_car_details_raw(self, vin: str) -> bytes:
+        poll = self._polls[vin] = self._polls.get(vin, -1) + 1
+        return self._payloads[poll % len(self._payloads)]
+
+
+@benchmark("client_update")
+def bench_client_update(size: int):
+    _, client = make_fleet(size)
+    client.api = StubAPI()
+    loop = asyncio.new_event_loop()
+
+    def run():
+        loop.run_until_complete(client.update())
+
+    return run
+
+
+@benchmark("entity_update_state")
+def bench_entity_update_state(size: int):
+    _, entities = make_entities(size, SmartEQEntity, SENSORS)
+
+    def run():
+        for entity in entities:
+            entity._update_state()
+
+    return run
+
+
+@benchmark("entity_extra_state_attributes")
+def bench_entity_extra_state_attributes(size: int):
+    _, entities = make_entities(size, SmartEQEntity, SENSORS)
+
+    def run():
+        for entity in entities:
+            entity.extra_state_attributes
+
+    return run
+
+
+@benchmark("entity_extra_state_attributes_changed")
+def bench_entity_extra_state_attributes_changed(size: int):
+    client, entities = make_entities(size, SmartEQEntity, SENSORS)
+    groups = [car.electric for car in client.cars.values()] + [car.odometer for car in client.cars.values()]
+
+    def run():
+        for group in groups:
+            group.version += 1
+        for entity in entities:
+            entity.extra_state_attributes
+
+    return run
+
+
+@benchmark("binary_sensor_is_on")
+def bench_binary_sensor_is_on(size: int):
+    _, entities = make_entities(size, SmartEQBinarySensor, BINARY_SENSORS)
+
+    def run():
+        for entity in entities:
+            # Read the car value again, like after an update_callback
+            entity._state = None
+            entity.is_on
+
+    return run
+
+
+@benchmark("oauth_cached_token")
+def bench_oauth_cached_token(size: int):
+    oauth = Oauth()
+    loop = asyncio.new_event_loop()
+    token = {"access_token": "a", "refresh_token": "r", "expires_at": 4102444800}
+    loop.run_until_complete(oauth._token_store.async_save(token))
+
+    async def read_tokens():
+        for _ in range(size):
+            await oauth.async_get_cached_token()
+
+    def run():
+        loop.run_until_complete(read_tokens())
+
+    return run
+
+
+def measure(run, repeat: int = 5) -> float:
+    """Return the best time of one call of run in seconds."""
+    timer = timeit.Timer(run)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as baseline_file:
+        return json.load(baseline_file)["results"]
+
+
+def save_baseline(path: str, results: dict) -> None:
+    with open(path, "w", encoding="utf-8") as baseline_file:
+        json.dump(
+            {"python": platform.python_version(), "machine": platform.machine(), "results": results},
+            baseline_file,
+            indent=2,
+            sort_keys=True,
+        )
+        baseline_file.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--filter", default="*", help="only run benchmarks matching this glob")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown, 0.25 is 25%%")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+
+    for name, setup in BENCHMARKS.items():
+        if not fnmatch.fnmatch(name, f"*{args.filter}*"):
+            continue
+        for size in args.sizes:
+            key = f"{name}[{size}]"
+            seconds = results[key] = measure(setup(size))
+
+            line = f"{key:<45} {seconds * 1e6:12.2f} us {seconds * 1e6 / size:10.3f} us/car"
+            if key in baseline:
+                change = seconds / baseline[key] - 1
+                line += f" {change:+8.1%}"
+                if change > args.tolerance:
+                    regressions.append(key)
+                    line += "  REGRESSION"
+            print(line)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f"Baseline written to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} benchmarks slower than the baseline by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
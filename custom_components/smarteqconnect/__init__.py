@@ -1,35 +1,48 @@
 """The Smart EQ connect 2021 integration."""
 import asyncio
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter
 from typing import Any
 
 import homeassistant.helpers.device_registry as dr
 import voluptuous as vol
 from homeassistant.config_entries import SOURCE_REAUTH, ConfigEntry
-from homeassistant.const import LENGTH_KILOMETERS, LENGTH_MILES
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    EVENT_HOMEASSISTANT_CLOSE,
+    LENGTH_KILOMETERS,
+    LENGTH_MILES,
+)
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryNotReady
-from homeassistant.helpers import aiohttp_client
 from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.util import slugify
 from homeassistant.util.unit_system import US_CUSTOMARY_SYSTEM
 
-from .car import Car, Features
+from .api import create_session
+from .car import Car, Features, RetrievalStatus
+from .cassette import Cassette
 from .client import Client
 from .const import (
     ATTR_MB_MANUFACTURER,
+    CASSETTE_RECORD_PATH,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MIN_POLL_INTERVAL,
     CONF_REGION,
     CONF_VIN,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
     DOMAIN,
+    INIT_REFRESH_RETRY_DELAY,
     LOGGER,
     SERVICE_PREHEAT_START,
     SERVICE_VIN_SCHEMA,
     SMARTEQ_COMPONENTS,
 )
 from .const import Sensor_Config_Fields as scf
-from .errors import WebsocketError
+from .coordinator import SmartEQCoordinator
+from .errors import RequestError, WebsocketError
 
 CONFIG_SCHEMA = vol.Schema({DOMAIN: vol.Schema({})}, extra=vol.ALLOW_EXTRA)
 DEBUG_ADD_FAKE_VIN = False
@@ -46,13 +59,13 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     """Set up Smart EQ connect 2021 from a config entry."""
 
     try:
-
         # Todo: Find the right way to migrate old configs
         region = config_entry.data.get(CONF_REGION, None)
         if region is None:
             region = "Europe"
 
         smarteq = SmartEQContext(hass, config_entry, region=region)
+        config_entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, smarteq.async_close))
 
         token_info = await smarteq.client.oauth.async_get_cached_token()
 
@@ -65,41 +78,74 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
                     data=config_entry,
                 )
             )
+            await smarteq.async_close()
             return False
 
-        masterdata = await smarteq.client.api.get_user_info()
-        smarteq.client._write_debug_json_output(masterdata, "md")
+        smarteq.client.oauth.start_token_renewal()
 
-        for car in masterdata.get("authorizations"):
+        masterdata = await smarteq.client.api.get_user_info()
 
+        for car in masterdata.authorizations:
             # Car is excluded, we do not add this
-            if car.get("fin") in config_entry.options.get("excluded_cars", ""):
+            if smarteq.client.is_excluded(car.fin):
                 continue
 
-            car_details = await smarteq.client.api.get_car_details_init(car.get("fin"))
-            smarteq.client._write_debug_json_output(car_details, "cd")
+            current_car = Car()
+            current_car.finorvin = car.fin
+            current_car.licenseplate = car.licensePlate or car.fin
+            current_car._last_message_received = int(round(time.time() * 1000))
+
+            smarteq.client.add_car(current_car)
+            LOGGER.debug("Init - car added - %s", current_car.finorvin)
+
+        # init-data of all cars and the first refresh run side by side, a failing car doesn't stop the others
+        cars = list(smarteq.client.cars.values())
+        cars_details, first_updates = await asyncio.gather(
+            asyncio.gather(*[smarteq.client.get_car_details_init(car) for car in cars], return_exceptions=True),
+            asyncio.gather(*[smarteq.client.update_car(car) for car in cars], return_exceptions=True),
+        )
+        failed = {
+            car.finorvin: car_details
+            for car, car_details in zip(cars, cars_details)
+            if isinstance(car_details, BaseException)
+        }
 
-            dev_reg = dr.async_get(hass)
+        # A car without a first refresh would get no entities, retry the failed cars once
+        retry = [
+            car
+            for car, changed in zip(cars, first_updates)
+            if car.finorvin not in failed and (changed is None or isinstance(changed, BaseException))
+        ]
+        if retry:
+            LOGGER.warning("Init - first refresh failed for %s cars - retry", len(retry))
+            await asyncio.sleep(INIT_REFRESH_RETRY_DELAY)
+            retries = await asyncio.gather(*[smarteq.client.update_car(car) for car in retry], return_exceptions=True)
+            for car, changed in zip(retry, retries):
+                if changed is None or isinstance(changed, BaseException):
+                    failed[car.finorvin] = changed or "first refresh failed"
+
+        for car in cars:
+            if car.finorvin in failed:
+                LOGGER.warning(
+                    "Init - car %s skipped, it is retried with the next setup: %s", car.finorvin, failed[car.finorvin]
+                )
+                smarteq.client.remove_car(car)
+        if cars and not smarteq.client.cars:
+            raise RequestError(f"Init failed for all {len(cars)} cars")
+
+        dev_reg = dr.async_get(hass)
+        for car, car_details in zip(cars, cars_details):
+            if car.finorvin in failed:
+                continue
             dev_reg.async_get_or_create(
                 config_entry_id=config_entry.entry_id,
                 connections=set(),
-                identifiers={(DOMAIN, car.get("fin"))},
+                identifiers={(DOMAIN, car.finorvin)},
                 manufacturer=ATTR_MB_MANUFACTURER,
-                model=car_details.get("vehicleData")
-                .get("salesRelatedInformation")
-                .get("baumuster")
-                .get("baumusterDescription"),
-                name=car.get("licensePlate", car.get("fin")),
+                model=car_details.vehicleData.salesRelatedInformation.baumuster.baumusterDescription,
+                name=car.licenseplate,
             )
 
-            current_car = Car()
-            current_car.finorvin = car.get("fin")
-            current_car.licenseplate = car.get("licensePlate", car.get("fin"))
-            current_car._last_message_received = int(round(time.time() * 1000))
-
-            smarteq.client.cars.append(current_car)
-            LOGGER.debug("Init - car added - %s", current_car.finorvin)
-
         hass.data.setdefault(DOMAIN, {})
         hass.data[DOMAIN] = smarteq
 
@@ -112,14 +158,19 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
             return await smarteq.client.update()
 
         async def preheat_start(call) -> None:
-            await smarteq.client.api.start_preheating(call.data.get(CONF_VIN))
+            car = smarteq.client.get_car(call.data.get(CONF_VIN))
+            if car is None:
+                LOGGER.error("Service preheat_start - unknown or excluded car %s", call.data.get(CONF_VIN))
+                return
+            await smarteq.client.api.start_preheating(car.finorvin)
 
         hass.services.async_register(DOMAIN, SERVICE_PREHEAT_START, preheat_start, schema=SERVICE_VIN_SCHEMA)
 
         await smarteq.on_dataload_complete()
 
-    except WebsocketError as err:
+    except (WebsocketError, RequestError) as err:
         LOGGER.error("Config entry failed: %s", err)
+        await smarteq.async_close()
         raise ConfigEntryNotReady from err
 
     return True
@@ -134,6 +185,7 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     )
     if unload_ok:
         if hass.data[DOMAIN]:
+            await hass.data[DOMAIN].async_close()
             del hass.data[DOMAIN]
 
     return unload_ok
@@ -145,33 +197,70 @@ class SmartEQContext:
         self._entry_setup_complete: bool = False
         self._hass = hass
         self._region = region
+        self._session = create_session()
+        recorders = []
+        if CASSETTE_RECORD_PATH:
+            recorders.append(Cassette(hass.config.path(CASSETTE_RECORD_PATH, f"cassette-{int(time.time())}.jsonl")))
         self.client = Client(
             hass=hass,
-            session=aiohttp_client.async_get_clientsession(hass),
+            session=self._session,
             config_entry=config_entry,
             region=self._region,
+            recorders=recorders,
+        )
+        self.coordinator = SmartEQCoordinator(
+            hass,
+            self.client,
+            min_interval=config_entry.options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL),
+            max_interval=config_entry.options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL),
         )
 
-    async def update_all(self, *_: Any):
-        LOGGER.debug("SmartEQ - Cars update all")
-        await self.client.update()
+    async def async_close(self, *_: Any):
+        """Stop the refresh, the token renewal and close the pooled session of this config entry."""
+        self.coordinator.async_stop()
+        self.client.oauth.stop_token_renewal()
+        for recorder in self.client.recorders:
+            await recorder.async_close()
+        if not self._session.closed:
+            LOGGER.debug("SmartEQ - Close session")
+            await self._session.close()
 
     async def on_dataload_complete(self, *_: Any):
         LOGGER.info("Car Load complete - start sensor creation")
 
-        await self.client.update()
-
         if not self._entry_setup_complete:
             for component in SMARTEQ_COMPONENTS:
                 self._hass.async_create_task(
                     self._hass.config_entries.async_forward_entry_setup(self._config_entry, component)
                 )
 
-        async_track_time_interval(self._hass, self.update_all, timedelta(seconds=30))
+        self.coordinator.async_start()
 
         self._entry_setup_complete = True
 
 
+@lru_cache(maxsize=None)
+def car_value_accessor(feature, object_name, attrib_name):
+    """Return a function reading feature.object_name.attrib_name from a car.
+
+    The attribute path is resolved once, reading it is a single attrgetter call.
+    The returned function takes the car and a default for missing values.
+    """
+    if object_name:
+        path = f"{object_name}.{attrib_name}" if not feature else f"{feature}.{object_name}.{attrib_name}"
+    else:
+        path = attrib_name
+    getter = attrgetter(path)
+
+    def get_car_value(car, default_value):
+        try:
+            return getter(car)
+        except AttributeError:
+            return default_value
+
+    return get_car_value
+
+
 class SmartEQEntity(Entity):
     """Entity class for SmartEQ devices."""
 
@@ -184,6 +273,7 @@ class SmartEQEntity(Entity):
         self._sensor_config = sensor_config
 
         self._state = None
+        self._retrievalstatus = None
         self._sensor_name = sensor_config[scf.DISPLAY_NAME.value]
         self._internal_unit = sensor_config[scf.UNIT_OF_MEASUREMENT.value]
         self._unit = sensor_config[scf.UNIT_OF_MEASUREMENT.value]
@@ -192,11 +282,25 @@ class SmartEQEntity(Entity):
         self._attrib_name = sensor_config[scf.VALUE_FIELD_NAME.value]
         self._extended_attributes = sensor_config[scf.EXTENDED_ATTRIBUTE_LIST.value]
         self._unique_id = slugify(f"{self._vin}_{self._internal_name}")
-        self._car = next(car for car in self._data.client.cars if car.finorvin == self._vin)
+        self._car = self._data.client.get_car(self._vin)
 
         self._licenseplate = self._car.licenseplate
         self._name = f"{self._licenseplate} {self._sensor_name}"
 
+        self._get_state_value = car_value_accessor(self._feature_name, self._object_name, self._attrib_name)
+        self._get_retrievalstatus = car_value_accessor(self._feature_name, self._object_name, "retrievalstatus")
+        self._get_timestamp = car_value_accessor(self._feature_name, self._object_name, "timestamp")
+        self._extended_accessors = [
+            (
+                attrib,
+                car_value_accessor(self._feature_name, attrib, "retrievalstatus"),
+                car_value_accessor(self._feature_name, attrib, "value"),
+            )
+            for attrib in (self._extended_attributes or ())
+        ]
+        self._attributes_cache = None
+        self._attributes_cache_key = None
+
     @property
     def name(self):
         """Return the name of the sensor."""
@@ -209,9 +313,9 @@ class SmartEQEntity(Entity):
 
     def device_retrieval_status(self):
         if self._sensor_name == "Car":
-            return "VALID"
+            return RetrievalStatus.VALID
 
-        return self._get_car_value(self._feature_name, self._object_name, "retrievalstatus", "error")
+        return self._get_retrievalstatus(self._car, RetrievalStatus.UNKNOWN)
 
     @property
     def device_info(self):
@@ -225,28 +329,40 @@ class SmartEQEntity(Entity):
 
     @property
     def extra_state_attributes(self):
-        """Return the state attributes."""
+        """Return the state attributes, cached per version of the car group they are read from."""
+
+        group = getattr(self._car, self._feature_name, None) if self._feature_name else None
+        if group is None:
+            return self._build_extra_state_attributes()
+
+        cache_key = (id(group), group.version)
+        if self._attributes_cache_key != cache_key:
+            self._attributes_cache = self._build_extra_state_attributes()
+            self._attributes_cache_key = cache_key
+        return self._attributes_cache
 
+    def _build_extra_state_attributes(self):
         state = {
             "car": self._licenseplate,
             "vin": self._vin,
         }
 
-        for item in ["retrievalstatus", "timestamp"]:
-            value = self._get_car_value(self._feature_name, self._object_name, item, None)
-            if value:
-                state[item] = value if item != "timestamp" else datetime.fromtimestamp(int(value))
+        retrievalstatus = self._get_retrievalstatus(self._car, None)
+        if retrievalstatus is not None:
+            state["retrievalstatus"] = retrievalstatus.name
 
-        if self._extended_attributes is not None:
-            for attrib in self._extended_attributes:
+        timestamp = self._get_timestamp(self._car, None)
+        if timestamp:
+            state["timestamp"] = datetime.fromtimestamp(int(timestamp))
 
-                retrievalstatus = self._get_car_value(self._feature_name, attrib, "retrievalstatus", "error")
+        for attrib, get_retrievalstatus, get_value in self._extended_accessors:
+            retrievalstatus = get_retrievalstatus(self._car, RetrievalStatus.UNKNOWN)
 
-                if retrievalstatus == "VALID" or retrievalstatus == 0:
-                    state[attrib] = self._get_car_value(self._feature_name, attrib, "value", "error")
+            if retrievalstatus is RetrievalStatus.VALID:
+                state[attrib] = get_value(self._car, "error")
 
-                if retrievalstatus == "NOT_RECEIVED":
-                    state[attrib] = "NOT_RECEIVED"
+            if retrievalstatus is RetrievalStatus.NOT_RECEIVED:
+                state[attrib] = RetrievalStatus.NOT_RECEIVED.name
         return state
 
     @property
@@ -264,50 +380,37 @@ class SmartEQEntity(Entity):
 
     @property
     def should_poll(self):
-        return True
-
-    def update(self):
-        """Get the latest data and updates the states."""
+        return False
 
-        self._state = self._get_car_value(self._feature_name, self._object_name, self._attrib_name, "error")
+    def _update_state(self):
+        """Get the latest data from the car, runs on the event loop."""
 
-    def _get_car_value(self, feature, object_name, attrib_name, default_value):
-        value = None
+        self._state = self._get_state_value(self._car, "error")
+        self._retrievalstatus = self.device_retrieval_status()
 
-        if object_name:
-            if not feature:
-                value = getattr(
-                    getattr(self._car, object_name, default_value),
-                    attrib_name,
-                    default_value,
-                )
-            else:
-                value = getattr(
-                    getattr(
-                        getattr(self._car, feature, default_value),
-                        object_name,
-                        default_value,
-                    ),
-                    attrib_name,
-                    default_value,
-                )
-
-        else:
-            value = getattr(self._car, attrib_name, default_value)
+    def _get_watched_attributes(self):
+        """Return the (group, option) tuples this entity reads, None for car level values."""
+        if not self._feature_name or not self._object_name:
+            return None
 
-        return value
+        attributes = {(self._feature_name, self._object_name)}
+        if self._extended_attributes:
+            attributes.update((self._feature_name, attrib) for attrib in self._extended_attributes)
+        return attributes
 
+    @callback
     def update_callback(self):
-        """Schedule a state update."""
-        self.schedule_update_ha_state(True)
+        """Update the state from the car data and write it."""
+        self._update_state()
+        self.async_write_ha_state()
 
     async def async_added_to_hass(self):
         """Add callback after being added to hass.
 
         Show latest data after startup.
         """
-        self._car.add_update_listener(self.update_callback)
-        self.async_schedule_update_ha_state(True)
+        self._car.add_update_listener(self.update_callback, self._get_watched_attributes())
+        self._update_state()
 
     async def async_will_remove_from_hass(self):
         """Entity being removed from hass."""
@@ -2,90 +2,183 @@
 import asyncio
 import json
 import logging
+import time
 import uuid
-from typing import Optional
+from typing import Optional, Sequence
 
-from aiohttp import ClientSession, ClientTimeout
+from aiohttp import ClientSession, ClientTimeout, DummyCookieJar, TCPConnector
 from aiohttp.client_exceptions import ClientError
 
 from .const import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_CONNECTION_LIMIT_PER_HOST,
+    DEFAULT_DNS_CACHE_TTL,
+    DEFAULT_KEEPALIVE_TIMEOUT,
+    DEFAULT_REQUEST_TIMEOUT,
     DEVICE_USER_AGENT,
     LOGIN_APP_ID_EU,
     REST_API_BASE,
     SYSTEM_PROXY,
     VERIFY_SSL,
 )
-from .errors import RequestError
+from .errors import (
+    AuthenticationError,
+    RateLimitError,
+    RequestError,
+    ResponseError,
+    ServerError,
+)
+from .flight_recorder import ExchangeRecorder, record_exchange
+from .models import InitData, RefreshData, UserInfo, decode
 from .oauth import Oauth
 
 LOGGER = logging.getLogger(__name__)
 
 DEFAULT_LIMIT: int = 288
-DEFAULT_TIMEOUT: int = 30
+
+
+def create_session(
+    request_timeout: int = DEFAULT_REQUEST_TIMEOUT,
+    connect_timeout: int = DEFAULT_CONNECT_TIMEOUT,
+    limit: int = DEFAULT_CONNECTION_LIMIT,
+    limit_per_host: int = DEFAULT_CONNECTION_LIMIT_PER_HOST,
+) -> ClientSession:
+    """Create the pooled session shared by the API and the Oauth client.
+
+    The connector keeps connections alive between polls and caches DNS lookups,
+    so a refresh cycle does not pay for a new TCP and TLS handshake. The caller
+    owns the session and has to close it on unload.
+    """
+    connector = TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        ttl_dns_cache=DEFAULT_DNS_CACHE_TTL,
+        keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True,
+        ssl=None if VERIFY_SSL else False,
+    )
+
+    return ClientSession(
+        connector=connector,
+        timeout=ClientTimeout(total=request_timeout, connect=connect_timeout),
+        cookie_jar=DummyCookieJar(),
+    )
 
 
 class API:
     """Define the API object."""
 
-    def __init__(self, oauth: Oauth, session: Optional[ClientSession] = None, region: str = None) -> None:
+    def __init__(
+        self,
+        oauth: Oauth,
+        session: Optional[ClientSession] = None,
+        region: str = None,
+        recorders: Sequence[ExchangeRecorder] = (),
+        rest_api_base: str = REST_API_BASE,
+    ) -> None:
         """Initialize."""
         self._session: ClientSession = session
+        self._rest_api_base = rest_api_base
+        self._recorders = recorders
         self._oauth: Oauth = oauth
         self._region = region
         self._guid = str(uuid.uuid4())
 
-    async def _request(self, method: str, endpoint: str, **kwargs) -> list:
-        """Make a request against the API."""
-
-        url = REST_API_BASE + endpoint
-
-        kwargs.setdefault("headers", {})
-
-        token = await self._oauth.async_get_cached_token()
-
-        kwargs["headers"] = {
-            "Accept": "*/*",
-            "Authorization": "Bearer " + token["access_token"],
-            "Guid": self._guid,
-            "X-ApplicationName": LOGIN_APP_ID_EU,
-            "User-Agent": DEVICE_USER_AGENT,
-            "Content-Type": "application/json",
-        }
-
-        # use_running_session = self._session and not self._session.closed
-
-        use_running_session = False
-        LOGGER.debug("API - Request - Running Session : %s", use_running_session)
-
-        if use_running_session:
-            LOGGER.debug("API - Request - Running Session - URL: %s", url)
-            session = self._session
-        else:
-            LOGGER.debug("API - Request - New Session - URL: %s", url)
-            session = ClientSession(timeout=ClientTimeout(total=DEFAULT_TIMEOUT))
-
-        try:
-            async with session.request(method, url, proxy=SYSTEM_PROXY, verify_ssl=VERIFY_SSL, **kwargs) as resp:
-                return await resp.json()
-        except ClientError as err:
-            raise RequestError(f"Error requesting data from {url}: {err}")
-        finally:
-            if not use_running_session:
-                await session.close()
-
-    async def get_user_info(self) -> list:
+    async def _request(self, method: str, endpoint: str, raw: bool = False, model=None, **kwargs) -> list:
+        """Make a request against the API.
+
+        A 401 invalidates the cached token, waits for the (shared) token refresh
+        and replays the request once. Other error status codes raise a RequestError
+        subclass. With raw=True the undecoded response body is returned, with a
+        model the body is decoded into that model.
+        """
+
+        url = self._rest_api_base + endpoint
+
+        if self._session is None or self._session.closed:
+            raise RequestError(f"Error requesting data from {url}: session is closed")
+
+        LOGGER.debug("API - Request - URL: %s", url)
+
+        replay = True
+        while True:
+            token = await self._oauth.async_get_cached_token()
+            if token is None:
+                raise AuthenticationError(f"Error requesting data from {url}: no valid access token")
+
+            kwargs["headers"] = {
+                "Accept": "*/*",
+                "Authorization": "Bearer " + token["access_token"],
+                "Guid": self._guid,
+                "X-ApplicationName": LOGIN_APP_ID_EU,
+                "User-Agent": DEVICE_USER_AGENT,
+                "Content-Type": "application/json",
+            }
+
+            started = time.monotonic()
+            try:
+                async with self._session.request(
+                    method, url, proxy=SYSTEM_PROXY, verify_ssl=VERIFY_SSL, **kwargs
+                ) as resp:
+                    body = await resp.read()
+                    record_exchange(
+                        self._recorders, method, url, resp.status, started, kwargs["headers"], kwargs.get("data"), body
+                    )
+
+                    if resp.status == 401 and replay:
+                        LOGGER.debug("API - Request - 401 - refresh token and replay: %s", url)
+                        self._oauth.invalidate_token(token)
+                        replay = False
+                        continue
+
+                    self._raise_for_status(resp.status, url)
+                    if model is not None:
+                        return decode(body, model)
+                    if raw:
+                        return body
+                    return json.loads(body) if body else None
+            except (ClientError, asyncio.TimeoutError) as err:
+                record_exchange(
+                    self._recorders, method, url, None, started, kwargs["headers"], kwargs.get("data"), None, f"{err!r}"
+                )
+                raise RequestError(f"Error requesting data from {url}: {err}")
+            except ValueError as err:
+                raise ResponseError(f"Error decoding data from {url}: {err}")
+
+    @staticmethod
+    def _raise_for_status(status: int, url: str) -> None:
+        if status < 400:
+            return
+
+        message = f"Error requesting data from {url}: HTTP {status}"
+        if status in (401, 403):
+            raise AuthenticationError(message)
+        if status == 429:
+            raise RateLimitError(message)
+        if status >= 500:
+            raise ServerError(message)
+        raise RequestError(message)
+
+    async def get_user_info(self) -> UserInfo:
         """Get all devices associated with an API key."""
-        return await self._request("get", "/seqc/v0/users/current")
+        return await self._request("get", "/seqc/v0/users/current", model=UserInfo)
 
-    async def get_car_details_init(self, vin: str) -> list:
+    async def get_car_details_init(self, vin: str) -> InitData:
         """Get all devices infos associated with an fin."""
         return await self._request(
-            "get", f"/seqc/v0/vehicles/{ vin }/init-data?requestedData=BOTH&countryCode=DE&locale=de-DE"
+            "get", f"/seqc/v0/vehicles/{ vin }/init-data?requestedData=BOTH&countryCode=DE&locale=de-DE", model=InitData
         )
 
-    async def get_car_details(self, vin: str) -> list:
+    async def get_car_details(self, vin: str) -> RefreshData:
         """Get all devices infos associated with an fin."""
-        return await self._request("get", f"/seqc/v0/vehicles/{ vin }/refresh-data?requestedData=BOTH")
+        return await self._request(
+            "get", f"/seqc/v0/vehicles/{ vin }/refresh-data?requestedData=BOTH", model=RefreshData
+        )
+
+    async def get_car_details_raw(self, vin: str) -> bytes:
+        """Get the undecoded refresh-data body of a fin."""
+        return await self._request("get", f"/seqc/v0/vehicles/{ vin }/refresh-data?requestedData=BOTH", raw=True)
 
     async def get_car_capabilities_commands(self, vin: str) -> list:
         return await self._request("get", f"/v1/vehicle/{vin}/capabilities/commands")
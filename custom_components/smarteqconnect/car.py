@@ -1,48 +1,150 @@
 import collections
+import logging
 from datetime import datetime
+from enum import Enum
+
+LOGGER = logging.getLogger(__name__)
+
 
-ODOMETER_OPTIONS = [
-    "odo",
-    "ecoscoretotal",
-    "ecoScoreFluentDriving",
-    "ecoScoreSpeed",
-    "serviceintervaldays",
-    "serviceintervaldistance",
-]
+class RetrievalStatus(Enum):
+    """Canonical retrieval status of a car attribute.
 
-LOCATION_OPTIONS = []
+    The API reports it either as int or as string, both are mapped on ingest.
+    Only the codes known to be sent are mapped, any other is UNKNOWN.
+    """
 
-TIRE_OPTIONS = ["tirewarningsrdk"]
+    UNKNOWN = "UNKNOWN"
+    VALID = "VALID"
+    NOT_RECEIVED = "NOT_RECEIVED"
+    NOT_AVAILABLE = "NOT_AVAILABLE"
 
-WINDOW_OPTIONS = []
+    @classmethod
+    def from_raw(cls, raw):
+        # bool is an int, False would otherwise match the key 0
+        if isinstance(raw, bool) or not isinstance(raw, (int, str)):
+            return cls.UNKNOWN
+        return _RAW_RETRIEVAL_STATUS.get(raw, cls.UNKNOWN)
 
-DOOR_OPTIONS = []
 
-ELECTRIC_OPTIONS = [
-    "rangeelectric",
-    "electricconsumptionstart",
-    "soc",
-    "chargingactive",
-    "chargingstatus",
-    "precondNow",
-]
+_RAW_RETRIEVAL_STATUS = {
+    0: RetrievalStatus.VALID,
+    # Also the default of an option without a status, see Client._parse_car_detail
+    4: RetrievalStatus.NOT_AVAILABLE,
+    "VALID": RetrievalStatus.VALID,
+    "NOT_RECEIVED": RetrievalStatus.NOT_RECEIVED,
+}
 
-BINARY_SENSOR_OPTIONS = []
+_RAW_BOOLEANS = {
+    "ACTIVE": True,
+    "INACTIVE": False,
+    "true": True,
+    "false": False,
+    "1": True,
+    "0": False,
+    1: True,
+    0: False,
+}
 
-AUX_HEAT_OPTIONS = []
 
-PRE_COND_OPTIONS = []
+def to_bool(value):
+    """Convert the boolean representations of the API into a bool, None if unknown."""
+    # A JSON boolean is taken as it is, not through the int keys 1 and 0
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, str)):
+        result = _RAW_BOOLEANS.get(value)
+        if result is not None:
+            return result
 
-REMOTE_START_OPTIONS = []
+    LOGGER.debug("to_bool - unknown boolean value %s", value)
+    return None
 
-CAR_ALARM_OPTIONS = []
+
+FieldMapping = collections.namedtuple(
+    "FieldMapping", ["section", "group", "threshold", "converter"], defaults=[None, None]
+)
+
+# "option in the refresh-data payload": FieldMapping(
+#       section     json section of the payload the option is read from
+#       group       attribute of Car holding the value, see GROUP_CLASSES
+#       threshold   minimal numeric change before the option counts as changed,
+#                   timestamp-only changes are ignored for these options
+#       converter   function converting the raw value on ingest, e.g. to_bool
+# )
+FIELD_MAPPINGS = {
+    "odo": FieldMapping("status", "odometer"),
+    "ecoscoretotal": FieldMapping("status", "odometer", 1),
+    "ecoScoreFluentDriving": FieldMapping("status", "odometer", 1),
+    "ecoScoreSpeed": FieldMapping("status", "odometer", 1),
+    "serviceintervaldays": FieldMapping("status", "odometer"),
+    "serviceintervaldistance": FieldMapping("status", "odometer"),
+    "tirewarningsrdk": FieldMapping("status", "tires", converter=to_bool),
+    "rangeelectric": FieldMapping("precond", "electric", 1),
+    "electricconsumptionstart": FieldMapping("precond", "electric"),
+    "soc": FieldMapping("precond", "electric"),
+    "chargingactive": FieldMapping("precond", "electric", converter=to_bool),
+    "chargingstatus": FieldMapping("precond", "electric"),
+    "precondNow": FieldMapping("precond", "electric", converter=to_bool),
+}
+
+
+def _group_options(group):
+    return [option for option, mapping in FIELD_MAPPINGS.items() if mapping.group == group]
+
+
+ODOMETER_OPTIONS = _group_options("odometer")
+
+LOCATION_OPTIONS = _group_options("location")
+
+TIRE_OPTIONS = _group_options("tires")
+
+WINDOW_OPTIONS = _group_options("windows")
+
+DOOR_OPTIONS = _group_options("doors")
+
+ELECTRIC_OPTIONS = _group_options("electric")
+
+BINARY_SENSOR_OPTIONS = _group_options("binarysensors")
+
+AUX_HEAT_OPTIONS = _group_options("auxheat")
+
+PRE_COND_OPTIONS = _group_options("precond")
+
+REMOTE_START_OPTIONS = _group_options("remote_start")
+
+CAR_ALARM_OPTIONS = _group_options("car_alarm")
 
 
 class Car(object):
+    __slots__ = (
+        "licenseplate",
+        "finorvin",
+        "_messages_received",
+        "_last_message_received",
+        "_last_command_type",
+        "_last_command_state",
+        "_last_command_error_code",
+        "_last_command_error_message",
+        "_last_command_time_stamp",
+        "binarysensors",
+        "tires",
+        "odometer",
+        "doors",
+        "location",
+        "windows",
+        "features",
+        "auxheat",
+        "precond",
+        "electric",
+        "car_alarm",
+        "_entry_setup_complete",
+        "_update_listeners",
+    )
+
     def __init__(self):
         self.licenseplate = None
         self.finorvin = None
-        self._messages_received = collections.Counter(f=0, p=0)
+        self._messages_received = collections.Counter(f=0, p=0, u=0)
         self._last_message_received = 0
         self._last_command_type = ""
         self._last_command_state = ""
@@ -62,123 +164,160 @@ class Car(object):
         self.electric = None
         self.car_alarm = None
         self._entry_setup_complete = False
-        self._update_listeners = set()
+        self._update_listeners = {}
 
     @property
     def full_update_messages_received(self):
-        return CarAttribute(self._messages_received["f"], "VALID", None)
+        return CarAttribute(self._messages_received["f"], RetrievalStatus.VALID, None)
 
     @property
     def partital_update_messages_received(self):
-        return CarAttribute(self._messages_received["p"], "VALID", None)
+        return CarAttribute(self._messages_received["p"], RetrievalStatus.VALID, None)
+
+    @property
+    def unchanged_update_messages_received(self):
+        return CarAttribute(self._messages_received["u"], RetrievalStatus.VALID, None)
 
     @property
     def last_message_received(self):
         if self._last_message_received > 0:
-            return CarAttribute(datetime.fromtimestamp(int(round(self._last_message_received / 1000))), "VALID", None)
+            return CarAttribute(
+                datetime.fromtimestamp(int(round(self._last_message_received / 1000))), RetrievalStatus.VALID, None
+            )
 
-        return CarAttribute(None, "NOT_RECEIVED", None)
+        return CarAttribute(None, RetrievalStatus.NOT_RECEIVED, None)
 
     @property
     def last_command_type(self):
-        return CarAttribute(self._last_command_type, "VALID", self._last_command_time_stamp)
+        return CarAttribute(self._last_command_type, RetrievalStatus.VALID, self._last_command_time_stamp)
 
     @property
     def last_command_state(self):
-        return CarAttribute(self._last_command_state, "VALID", self._last_command_time_stamp)
+        return CarAttribute(self._last_command_state, RetrievalStatus.VALID, self._last_command_time_stamp)
 
     @property
     def last_command_error_code(self):
-        return CarAttribute(self._last_command_error_code, "VALID", self._last_command_time_stamp)
+        return CarAttribute(self._last_command_error_code, RetrievalStatus.VALID, self._last_command_time_stamp)
 
     @property
     def last_command_error_message(self):
-        return CarAttribute(self._last_command_error_message, "VALID", self._last_command_time_stamp)
+        return CarAttribute(self._last_command_error_message, RetrievalStatus.VALID, self._last_command_time_stamp)
+
+    @property
+    def is_active(self):
+        """Return True while the car is charging or preconditioning."""
+        if self.electric is None:
+            return False
 
-    def add_update_listener(self, listener):
-        """Add a listener for update notifications."""
-        self._update_listeners.add(listener)
+        for option in ("chargingactive", "precondNow"):
+            attribute = getattr(self.electric, option, None)
+            if attribute is not None and attribute.value is True:
+                return True
+        return False
+
+    def add_update_listener(self, listener, attributes=None):
+        """Add a listener for update notifications.
+
+        attributes is a set of (group, option) tuples the listener depends on,
+        None subscribes to every update.
+        """
+        self._update_listeners[listener] = frozenset(attributes) if attributes is not None else None
 
     def remove_update_callback(self, listener):
         """Remove a listener for update notifications."""
-        self._update_listeners.discard(listener)
+        self._update_listeners.pop(listener, None)
 
-    def publish_updates(self):
-        """Schedule call all registered callbacks."""
-        for callback in self._update_listeners:
-            callback()
+    def publish_updates(self, changed=None):
+        """Call the registered callbacks affected by the changed (group, option) tuples."""
+        for callback, attributes in list(self._update_listeners.items()):
+            if changed is None or attributes is None or not attributes.isdisjoint(changed):
+                callback()
 
 
-class Tires(object):
-    def __init__(self):
-        self.name = "Tires"
+class CarGroup(object):
+    """Base of the attribute groups of a car.
 
+    Every group has a fixed schema: its options from FIELD_MAPPINGS are slots,
+    so a group carries no per-instance __dict__. version is increased by the
+    parser whenever one of the options changed.
+    """
+
+    __slots__ = ("version",)
+    name = None
 
-class Odometer(object):
     def __init__(self):
-        self.name = "Odometer"
+        self.version = 0
 
 
-class Features(object):
-    def __init__(self):
-        self.name = "Features"
+class Tires(CarGroup):
+    __slots__ = tuple(TIRE_OPTIONS)
+    name = "Tires"
 
 
-class Windows(object):
-    def __init__(self):
-        self.name = "Windows"
+class Odometer(CarGroup):
+    __slots__ = tuple(ODOMETER_OPTIONS)
+    name = "Odometer"
 
 
-class Doors(object):
-    def __init__(self):
-        self.name = "Doors"
+class Features(CarGroup):
+    __slots__ = ()
+    name = "Features"
 
 
-class Electric(object):
-    def __init__(self):
-        self.name = "Electric"
+class Windows(CarGroup):
+    __slots__ = tuple(WINDOW_OPTIONS)
+    name = "Windows"
 
 
-class Auxheat(object):
-    def __init__(self):
-        self.name = "Auxheat"
+class Doors(CarGroup):
+    __slots__ = tuple(DOOR_OPTIONS)
+    name = "Doors"
 
 
-class Precond(object):
-    def __init__(self):
-        self.name = "Precond"
+class Electric(CarGroup):
+    __slots__ = tuple(ELECTRIC_OPTIONS)
+    name = "Electric"
 
 
-class Binary_Sensors(object):
-    def __init__(self):
-        self.name = "Binary_Sensors"
+class Auxheat(CarGroup):
+    __slots__ = tuple(AUX_HEAT_OPTIONS)
+    name = "Auxheat"
 
 
-class Remote_Start(object):
-    def __init__(self):
-        self.name = "Remote_Start"
+class Precond(CarGroup):
+    __slots__ = tuple(PRE_COND_OPTIONS)
+    name = "Precond"
 
 
-class Car_Alarm(object):
-    def __init__(self):
-        self.name = "Car_Alarm"
+class Binary_Sensors(CarGroup):
+    __slots__ = tuple(BINARY_SENSOR_OPTIONS)
+    name = "Binary_Sensors"
 
 
-class Location(object):
+class Remote_Start(CarGroup):
+    __slots__ = tuple(REMOTE_START_OPTIONS)
+    name = "Remote_Start"
+
+
+class Car_Alarm(CarGroup):
+    __slots__ = tuple(CAR_ALARM_OPTIONS)
+    name = "Car_Alarm"
+
+
+class Location(CarGroup):
+    __slots__ = ("latitude", "longitude", "heading") + tuple(LOCATION_OPTIONS)
+    name = "Location"
+
     def __init__(self, latitude=None, longitude=None, heading=None):
-        self.name = "Location"
-        self.latitude = None
-        self.longitude = None
-        self.heading = None
-        if latitude is not None:
-            self.latitude = latitude
-        if longitude is not None:
-            self.longitude = longitude
-        if heading is not None:
-            self.heading = heading
+        super().__init__()
+        self.latitude = latitude
+        self.longitude = longitude
+        self.heading = heading
 
 
 class CarAttribute(object):
+    __slots__ = ("value", "retrievalstatus", "timestamp", "distance_unit", "display_value", "unit")
+
     def __init__(self, value, retrievalstatus, timestamp, distance_unit=None, display_value=None, unit=None):
         self.value = value
         self.retrievalstatus = retrievalstatus
@@ -186,3 +325,46 @@ class CarAttribute(object):
         self.distance_unit = distance_unit
         self.display_value = display_value
         self.unit = unit
+
+    def update(self, value, retrievalstatus, timestamp):
+        """Update the attribute in place instead of allocating a new one."""
+        self.value = value
+        self.retrievalstatus = retrievalstatus
+        self.timestamp = timestamp
+
+
+GROUP_CLASSES = {
+    "binarysensors": Binary_Sensors,
+    "tires": Tires,
+    "odometer": Odometer,
+    "doors": Doors,
+    "location": Location,
+    "windows": Windows,
+    "auxheat": Auxheat,
+    "precond": Precond,
+    "electric": Electric,
+    "car_alarm": Car_Alarm,
+}
+
+ParsePlan = collections.namedtuple("ParsePlan", ["sections", "groups"])
+
+
+def compile_field_mappings(field_mappings):
+    """Compile the field mappings into the steps of each payload section.
+
+    sections: {section: ((option, group, threshold, converter), ...)}
+    groups:   {group: (option, ...)}
+    """
+    sections = {}
+    groups = {}
+    for option, mapping in field_mappings.items():
+        sections.setdefault(mapping.section, []).append((option, mapping.group, mapping.threshold, mapping.converter))
+        groups.setdefault(mapping.group, []).append(option)
+
+    return ParsePlan(
+        {section: tuple(steps) for section, steps in sections.items()},
+        {group: tuple(options) for group, options in groups.items()},
+    )
+
+
+PARSE_PLAN = compile_field_mappings(FIELD_MAPPINGS)
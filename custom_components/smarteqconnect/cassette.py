@@ -0,0 +1,197 @@
+"""Record the API traffic into cassette files and replay it offline.
+
+A cassette is a JSON lines file, a header line with the format version
+followed by the exchanges of API and Oauth in the order they happened, one per
+line, including the response time of each exchange. The exchanges are appended
+in chunks of CASSETTE_FLUSH_SIZE in the executor, so a long recording does not
+grow in memory. Tokens are redacted when the exchanges are written, the vehicle
+payloads are kept as they are.
+ReplaySession serves a cassette to API and Oauth in place of the aiohttp
+ClientSession, with the recorded, a scaled or no latency.
+"""
+import asyncio
+import collections
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from aiohttp import RequestInfo
+from aiohttp.client_exceptions import ClientConnectionError, ClientResponseError
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .const import CASSETTE_FLUSH_SIZE
+from .flight_recorder import ExchangeRecorder, redact_body
+
+LOGGER = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 2
+
+
+class Cassette(ExchangeRecorder):
+    """Append the exchanges of API and Oauth to a cassette file."""
+
+    def __init__(self, path: str, flush_size: int = CASSETTE_FLUSH_SIZE) -> None:
+        self.path = path
+        self.written = 0
+        self._flush_size = flush_size
+        self._pending = []
+        self._write_task = None
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        status: Optional[int],
+        started: float,
+        request_headers=None,
+        request_body=None,
+        response_body=None,
+        error: Optional[str] = None,
+    ) -> None:
+        # The headers only carry the token and the client identification, they are not replayed
+        self._pending.append(
+            (method.upper(), url, status, round(time.monotonic() - started, 4), request_body, response_body, error)
+        )
+        if len(self._pending) >= self._flush_size:
+            self._schedule_write()
+
+    async def async_close(self) -> None:
+        if self._pending:
+            self._schedule_write()
+        if self._write_task is not None:
+            await self._write_task
+            LOGGER.info("Cassette - %s exchanges written to %s", self.written, self.path)
+
+    def _schedule_write(self) -> None:
+        exchanges, self._pending = self._pending, []
+        # Chained on the previous write, so the chunks are appended in order
+        self._write_task = asyncio.get_running_loop().create_task(self._async_write(self._write_task, exchanges))
+
+    async def _async_write(self, previous: Optional[asyncio.Task], exchanges: list) -> None:
+        if previous is not None:
+            await previous
+        await asyncio.get_running_loop().run_in_executor(None, self._write, exchanges)
+
+    def _write(self, exchanges: list) -> None:
+        lines = [] if self.written else [json.dumps({"version": CASSETTE_VERSION})]
+        lines.extend(
+            json.dumps(
+                {
+                    "method": method,
+                    "url": url,
+                    "status": status,
+                    "latency": latency,
+                    "request_body": redact_body(request_body),
+                    "response_body": redact_body(response_body, max_size=len(response_body or "")),
+                    "error": error,
+                }
+            )
+            for method, url, status, latency, request_body, response_body, error in exchanges
+        )
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as cassette_file:
+                cassette_file.write("\n".join(lines) + "\n")
+            self.written += len(exchanges)
+        except OSError as err:
+            LOGGER.warning("Cassette - couldn't write to %s: %s", self.path, err)
+
+
+def load_cassette(path: str) -> list:
+    with open(path, encoding="utf-8") as cassette_file:
+        header = json.loads(cassette_file.readline() or "{}")
+        if header.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {header.get('version')} in {path}")
+        return [json.loads(line) for line in cassette_file if line.strip()]
+
+
+class ReplaySession:
+    """Serve recorded exchanges in place of the aiohttp ClientSession.
+
+    Requests are matched by method and URL and answered with the recorded exchanges
+    in their recorded order, the last exchange of a URL is repeated once the others
+    are used up. latency_scale 1 keeps the recorded response times, 0 answers
+    without delay. Unknown requests are answered with a 404.
+    """
+
+    def __init__(self, exchanges: list, latency_scale: float = 1.0) -> None:
+        self._exchanges = collections.defaultdict(collections.deque)
+        for exchange in exchanges:
+            self._exchanges[(exchange["method"], exchange["url"])].append(exchange)
+        self._latency_scale = latency_scale
+        self.closed = False
+        self.requests = 0
+
+    @classmethod
+    def from_file(cls, path: str, latency_scale: float = 1.0) -> "ReplaySession":
+        return cls(load_cassette(path), latency_scale=latency_scale)
+
+    def request(self, method: str, url: str, **kwargs) -> "_ReplayRequest":
+        return _ReplayRequest(self, method.upper(), url)
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def _async_replay(self, method: str, url: str) -> "ReplayResponse":
+        self.requests += 1
+
+        exchanges = self._exchanges.get((method, url))
+        if not exchanges:
+            LOGGER.debug("Replay - no exchange recorded for %s %s", method, url)
+            return ReplayResponse(method, url, 404, b"")
+
+        exchange = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+        if self._latency_scale:
+            await asyncio.sleep(exchange["latency"] * self._latency_scale)
+
+        if exchange["error"]:
+            raise ClientConnectionError(exchange["error"])
+
+        body = exchange["response_body"]
+        if body is None:
+            body = b""
+        elif isinstance(body, str):
+            body = body.encode("utf-8")
+        else:
+            body = json.dumps(body).encode("utf-8")
+        return ReplayResponse(method, url, exchange["status"], body)
+
+
+class _ReplayRequest:
+    """The async context manager returned by ReplaySession.request."""
+
+    def __init__(self, session: ReplaySession, method: str, url: str) -> None:
+        self._session = session
+        self._method = method
+        self._url = url
+
+    async def __aenter__(self) -> "ReplayResponse":
+        return await self._session._async_replay(self._method, self._url)
+
+    async def __aexit__(self, *args) -> None:
+        return None
+
+
+class ReplayResponse:
+    """The subset of the aiohttp ClientResponse used by API and Oauth."""
+
+    def __init__(self, method: str, url: str, status: int, body: bytes) -> None:
+        self.method = method
+        self.url = URL(url)
+        self.status = status
+        self._body = body
+
+    async def read(self) -> bytes:
+        return self._body
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise ClientResponseError(
+                RequestInfo(self.url, self.method, CIMultiDictProxy(CIMultiDict())),
+                (),
+                status=self.status,
+                message=f"Replayed status {self.status}",
+            )
@@ -1,7 +1,7 @@
+import asyncio
+import hashlib
 import logging
-import time
-from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 
 from aiohttp import ClientSession
 from homeassistant.core import HomeAssistant
@@ -17,8 +17,14 @@ from .const import (
     DEFAULT_CACHE_PATH,
     DEFAULT_COUNTRY_CODE,
     DEFAULT_LOCALE,
+    DEFAULT_MAX_PARALLEL_REQUESTS,
     DEFAULT_TOKEN_PATH,
+    LOGIN_BASE_URI,
+    REST_API_BASE,
 )
+from .errors import RequestError
+from .flight_recorder import ExchangeRecorder, FlightRecorder
+from .models import RefreshData, decode
 from .oauth import Oauth
 
 LOGGER = logging.getLogger(__name__)
@@ -35,6 +41,10 @@ class Client:  # pylint: disable-too-few-public-methods
         config_entry=None,
         cache_path: Optional[str] = None,
         region: str = None,
+        max_parallel_requests: int = DEFAULT_MAX_PARALLEL_REQUESTS,
+        recorders: Sequence[ExchangeRecorder] = (),
+        rest_api_base: str = REST_API_BASE,
+        login_base_uri: str = LOGIN_BASE_URI,
     ) -> None:
         self._hass = hass
         self._region = region
@@ -48,15 +58,35 @@ class Client:  # pylint: disable-too-few-public-methods
                 self._country_code = self._config_entry.options.get(CONF_COUNTRY_CODE, DEFAULT_COUNTRY_CODE)
                 self._locale = self._config_entry.options.get(CONF_LOCALE, DEFAULT_LOCALE)
 
+        save_debug_files = self._config_entry.options.get(CONF_DEBUG_FILE_SAVE, False) if self._config_entry else False
+        self.flight_recorder = FlightRecorder(spill_path=self._debug_save_path if save_debug_files else None)
+        # The flight recorder for the diagnostics and the recorders of the caller, e.g. a Cassette
+        self.recorders = [self.flight_recorder, *recorders]
+
         self.oauth: Oauth = Oauth(
             session=session,
             locale=self._locale,
             country_code=self._country_code,
             cache_path=self._hass.config.path(DEFAULT_TOKEN_PATH),
             region=self._region,
+            recorders=self.recorders,
+            login_base_uri=login_base_uri,
+        )
+        self.api: API = API(
+            session=session,
+            oauth=self.oauth,
+            region=self._region,
+            recorders=self.recorders,
+            rest_api_base=rest_api_base,
+        )
+        # VIN -> Car
+        self.cars = {}
+        self._excluded_cars = self._parse_excluded_cars(
+            self._config_entry.options.get(CONF_EXCLUDED_CARS, "") if self._config_entry else ""
         )
-        self.api: API = API(session=session, oauth=self.oauth, region=self._region)
-        self.cars = []
+        self._request_semaphore = asyncio.Semaphore(max_parallel_requests)
+        self._payload_hashes = {}
+        self.skipped_updates = 0
 
     @property
     def pin(self) -> str:
@@ -66,82 +96,136 @@ class Client:  # pylint: disable-too-few-public-methods
         return None
 
     @property
-    def excluded_cars(self):
-        if self._config_entry:
-            if self._config_entry.options:
-                return self._config_entry.options.get(CONF_EXCLUDED_CARS, [])
-        return []
+    def excluded_cars(self) -> frozenset:
+        return self._excluded_cars
+
+    @staticmethod
+    def _parse_excluded_cars(excluded_cars) -> frozenset:
+        """Parse the comma-separated VIN list of the options once."""
+        if isinstance(excluded_cars, str):
+            excluded_cars = excluded_cars.split(",")
+        return frozenset(vin.strip().upper() for vin in excluded_cars if vin and vin.strip())
+
+    def is_excluded(self, vin: str) -> bool:
+        return vin.upper() in self._excluded_cars
+
+    # The cars are keyed by the upper-case VIN, like the excluded cars
+    def add_car(self, car):
+        self.cars[car.finorvin.upper()] = car
+
+    def remove_car(self, car):
+        self.cars.pop(car.finorvin.upper(), None)
+        self._payload_hashes.pop(car.finorvin, None)
+
+    async def get_car_details_init(self, car):
+        """Get the init-data of a car, bounded by max_parallel_requests."""
+
+        async with self._request_semaphore:
+            LOGGER.debug("Init - Car: %s", car.finorvin)
+            return await self.api.get_car_details_init(car.finorvin)
 
     async def update(self):
+        """Refresh all cars concurrently, bounded by max_parallel_requests."""
 
-        for car in self.cars:
-            LOGGER.debug("Update - Car: %s", car.finorvin)
-            car_detail = await self.api.get_car_details(car.finorvin)
-            # self._write_debug_json_output(car_detail, "upd")
-            # LOGGER.debug("Update - Car detail: %s", car_detail)
-
-            car.odometer = self._get_car_values(
-                car_detail,
-                car.finorvin,
-                Odometer() if not car.odometer else car.odometer,
-                ODOMETER_OPTIONS,
-                False,
-                "status",
-            )
-
-            car.electric = self._get_car_values(
-                car_detail,
-                car.finorvin,
-                Electric() if not car.electric else car.electric,
-                ELECTRIC_OPTIONS,
-                False,
-                "precond",
-            )
-
-            car.tires = self._get_car_values(
-                car_detail, car.finorvin, Tires() if not car.tires else car.tires, TIRE_OPTIONS, False, "status"
-            )
-
-        self.cars = [car if item.finorvin == car.finorvin else item for item in self.cars]
+        await asyncio.gather(*[self.update_car(car) for car in self.cars.values()])
         return True
 
-    def _get_car_values(self, car_detail, car_id, classInstance, options, update, json_attribute):
-        LOGGER.debug("get_car_values %s for %s called", classInstance.name, car_id)
-
-        for option in options:
-            if car_detail is not None:
+    async def update_car(self, car):
+        """Refresh a single car and parse the result as soon as it arrives.
 
-                curr = car_detail.get(json_attribute).get("data").get(option)
-                # LOGGER.debug("get_car_values - option: %s - curr - %s", option,curr)
-                if curr is not None:
+        Returns the set of changed (group, option) tuples or None if the request failed.
+        A body identical to the last one of this car is neither decoded nor parsed.
+        """
 
+        async with self._request_semaphore:
+            LOGGER.debug("Update - Car: %s", car.finorvin)
+            try:
+                payload = await self.api.get_car_details_raw(car.finorvin)
+            except RequestError as err:
+                LOGGER.warning("Update - Car: %s - failed: %s", car.finorvin, err)
+                return None
+
+        payload_hash = hashlib.blake2b(payload, digest_size=16).digest()
+        if self._payload_hashes.get(car.finorvin) == payload_hash:
+            LOGGER.debug("Update - Car: %s - payload unchanged", car.finorvin)
+            car._messages_received["u"] += 1
+            self.skipped_updates += 1
+            return set()
+
+        try:
+            car_detail = decode(payload, RefreshData)
+        except RequestError as err:
+            LOGGER.warning("Update - Car: %s - invalid payload: %s", car.finorvin, err)
+            return None
+
+        car._messages_received["f"] += 1
+
+        changed = self._parse_car_detail(car, car_detail)
+        # Only a fully parsed payload may be skipped next time
+        self._payload_hashes[car.finorvin] = payload_hash
+
+        LOGGER.debug("Update - Car: %s - changed: %s", car.finorvin, changed)
+        return changed
+
+    def _parse_car_detail(self, car, car_detail):
+        """Walk every mapped payload section once and update the car in place.
+
+        Returns the set of changed (group, option) tuples.
+        """
+        LOGGER.debug("parse_car_detail for %s called", car.finorvin)
+
+        groups = {}
+        for group_name in PARSE_PLAN.groups:
+            group = getattr(car, group_name)
+            if group is None:
+                group = GROUP_CLASSES[group_name]()
+                setattr(car, group_name, group)
+            groups[group_name] = group
+
+        changed = set()
+        for section_name, steps in PARSE_PLAN.sections.items():
+            section = getattr(car_detail, section_name, None)
+            data = section.data if section is not None and section.data is not None else {}
+
+            for option, group_name, threshold, converter in steps:
+                curr = data.get(option)
+                if isinstance(curr, dict):
                     value = curr.get("value", -1)
-                    status = curr.get("status", 4)
+                    status = RetrievalStatus.from_raw(curr.get("status", 4))
                     ts = curr.get("ts", 0)
-                    curr_status = CarAttribute(value, status, ts)
-                    setattr(classInstance, option, curr_status)
                 else:
-                    # Do not set status for non existing values on partial update
-                    if not update:
-                        curr_status = CarAttribute(0, 4, 0)
-                        setattr(classInstance, option, curr_status)
-            else:
-                setattr(classInstance, option, CarAttribute(-1, -1, None))
-
-        return classInstance
-
-    def _write_debug_json_output(self, data, datatype):
-
-        LOGGER.debug(self._config_entry.options)
-        if self._config_entry.options.get(CONF_DEBUG_FILE_SAVE, False):
-            path = self._debug_save_path
-            Path(path).mkdir(parents=True, exist_ok=True)
-
-            f = open(f"{path}/{datatype}{int(round(time.time() * 1000))}.json", "w")
-            f.write(f"{data}")
-            f.close()
-
-    def _get_car(self, vin: str):
-        for car in self.cars:
-            if car.finorvin == vin:
-                return car
+                    # Missing, null and malformed options are not available
+                    value, status, ts = 0, RetrievalStatus.NOT_AVAILABLE, 0
+
+                if converter is not None:
+                    value = converter(value)
+
+                group = groups[group_name]
+                current = getattr(group, option, None)
+                if self._is_changed(current, value, status, ts, threshold):
+                    if current is None:
+                        setattr(group, option, CarAttribute(value, status, ts))
+                    else:
+                        current.update(value, status, ts)
+                    changed.add((group_name, option))
+
+        for group_name in {group_name for group_name, _ in changed}:
+            groups[group_name].version += 1
+
+        return changed
+
+    @staticmethod
+    def _is_changed(current, value, status, ts, threshold=None) -> bool:
+        if current is None or current.retrievalstatus != status:
+            return True
+
+        if threshold is not None:
+            try:
+                return abs(float(value) - float(current.value)) >= threshold
+            except (TypeError, ValueError):
+                pass
+
+        return current.value != value or current.timestamp != ts
+
+    def get_car(self, vin: str):
+        return self.cars.get(vin.upper())
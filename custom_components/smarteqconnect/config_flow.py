@@ -16,9 +16,13 @@ from .const import (  # pylint:disable=unused-import
     CONF_DEBUG_FILE_SAVE,
     CONF_EXCLUDED_CARS,
     CONF_LOCALE,
+    CONF_MAX_POLL_INTERVAL,
+    CONF_MIN_POLL_INTERVAL,
     CONF_REGION,
     DEFAULT_COUNTRY_CODE,
     DEFAULT_LOCALE,
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
     DOMAIN,
     VERIFY_SSL,
 )
@@ -139,6 +143,8 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
         locale = options.get(CONF_LOCALE, DEFAULT_LOCALE)
         excluded_cars = options.get(CONF_EXCLUDED_CARS, "")
         save_debug_files = options.get(CONF_DEBUG_FILE_SAVE, False)
+        min_poll_interval = options.get(CONF_MIN_POLL_INTERVAL, DEFAULT_MIN_POLL_INTERVAL)
+        max_poll_interval = options.get(CONF_MAX_POLL_INTERVAL, DEFAULT_MAX_POLL_INTERVAL)
 
         return self.async_show_form(
             step_id="init",
@@ -147,6 +153,12 @@ class OptionsFlowHandler(config_entries.OptionsFlow):
                     vol.Optional(CONF_COUNTRY_CODE, default=country_code): str,
                     vol.Optional(CONF_LOCALE, default=locale): str,
                     vol.Optional(CONF_EXCLUDED_CARS, default=excluded_cars): str,
+                    vol.Optional(CONF_MIN_POLL_INTERVAL, default=min_poll_interval): vol.All(
+                        vol.Coerce(int), vol.Range(min=10)
+                    ),
+                    vol.Optional(CONF_MAX_POLL_INTERVAL, default=max_poll_interval): vol.All(
+                        vol.Coerce(int), vol.Range(min=10)
+                    ),
                     vol.Optional(CONF_DEBUG_FILE_SAVE, default=save_debug_files): bool,
                 }
             ),
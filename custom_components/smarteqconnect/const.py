@@ -1,5 +1,6 @@
 """Constants for the Smart EQ connect 2021 integration."""
 import logging
+import os
 from enum import Enum
 
 import voluptuous as vol
@@ -27,6 +28,8 @@ CONF_REGION = "region"
 CONF_VIN = "vin"
 CONF_TIME = "time"
 CONF_DEBUG_FILE_SAVE = "save_files"
+CONF_MIN_POLL_INTERVAL = "min_poll_interval"
+CONF_MAX_POLL_INTERVAL = "max_poll_interval"
 
 DATA_CLIENT = "data_client"
 
@@ -49,12 +52,50 @@ PROXIES = {}
 # }
 VERIFY_SSL = True
 
+# Record the API traffic into a cassette file in this folder, see cassette.py
+CASSETTE_RECORD_PATH = None
+# CASSETTE_RECORD_PATH = "custom_components/smarteqconnect/cassettes"
+# Exchanges kept in memory before they are appended to the cassette file
+CASSETTE_FLUSH_SIZE = 50
+
 ATTR_MB_MANUFACTURER = "Mercedes Benz"
 LOGIN_APP_ID_EU = "70d89501-938c-4bec-82d0-6abb550b0825"
-LOGIN_BASE_URI = "https://id.mercedes-benz.com"
+# Both base URIs can be pointed at a local stand-in server, see benchmarks/fake_server.py
+LOGIN_BASE_URI = os.environ.get("SMARTEQ_LOGIN_BASE_URI", "https://id.mercedes-benz.com")
 LOGIN_BASE_URI_NA = "https://id.mercedes-benz.com"
 LOGIN_BASE_URI_PA = "https://id.mercedes-benz.com"
-REST_API_BASE = "https://oneapp.microservice.smart.mercedes-benz.com"
+REST_API_BASE = os.environ.get("SMARTEQ_REST_API_BASE", "https://oneapp.microservice.smart.mercedes-benz.com")
+
+# Transport settings of the pooled session shared by API and Oauth
+DEFAULT_REQUEST_TIMEOUT = 30
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_CONNECTION_LIMIT = 20
+DEFAULT_CONNECTION_LIMIT_PER_HOST = 4
+DEFAULT_DNS_CACHE_TTL = 300
+DEFAULT_KEEPALIVE_TIMEOUT = 60
+
+# Per-car poll interval in seconds, idle cars back off from min to max
+DEFAULT_MIN_POLL_INTERVAL = 30
+DEFAULT_MAX_POLL_INTERVAL = 600
+POLL_BACKOFF_FACTOR = 2
+# Random jitter of each fetch as fraction of the poll interval
+POLL_JITTER_FRACTION = 0.1
+
+# In-memory recorder of the last API exchanges, see flight_recorder.py
+FLIGHT_RECORDER_SIZE = 50
+FLIGHT_RECORDER_MAX_BODY_SIZE = 65536
+FLIGHT_RECORDER_SPILL_FILES = 10
+
+# Upper bound of concurrent per-car requests during a refresh cycle
+DEFAULT_MAX_PARALLEL_REQUESTS = 4
+
+# Seconds before the cars without a first refresh are retried during setup
+INIT_REFRESH_RETRY_DELAY = 5
+
+# Background renewal of the access token, the fraction is relative to expires_in
+DEFAULT_TOKEN_RENEW_FRACTION = 0.75
+TOKEN_RENEW_MIN_DELAY = 10
+TOKEN_RENEW_RETRY_DELAY = 60
 
 
 SERVICE_REFRESH_TOKEN_URL = "refresh_access_token"
@@ -0,0 +1,125 @@
+"""Refresh coordinator for the Smart EQ connect 2021 integration."""
+import logging
+import random
+import zlib
+from functools import partial
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.event import async_call_later
+
+from .client import Client
+from .const import (
+    DEFAULT_MAX_POLL_INTERVAL,
+    DEFAULT_MIN_POLL_INTERVAL,
+    POLL_BACKOFF_FACTOR,
+    POLL_JITTER_FRACTION,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SmartEQCoordinator:
+    """Own the refresh schedule and push fresh data to the entities.
+
+    Entities do not poll. They register on their car via add_update_listener and
+    are called through Car.publish_updates as soon as the data of that car is in.
+
+    Every car has its own schedule. A car is polled with min_interval while it
+    is charging, preconditioning or its data changes, an idle car backs off step
+    by step up to max_interval.
+
+    The fetches of a fleet are spread across the interval: each car starts at a
+    phase offset derived from its VIN and every fetch gets a random jitter. The
+    jitter is applied around a nominal schedule, so it never accumulates and the
+    interval of each car stays intact.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: Client,
+        min_interval: int = DEFAULT_MIN_POLL_INTERVAL,
+        max_interval: int = DEFAULT_MAX_POLL_INTERVAL,
+    ) -> None:
+        self._hass = hass
+        self._client = client
+        self._min_interval = min_interval
+        self._max_interval = max(max_interval, min_interval)
+        self._intervals = {}
+        self._unsub_refresh = {}
+        self._nominal_times = {}
+        self._refreshing = set()
+        self._running = False
+
+    def async_start(self):
+        """Start the refresh schedule of all cars."""
+        self._running = True
+        for car in self._client.cars.values():
+            if car.finorvin not in self._unsub_refresh:
+                self._intervals[car.finorvin] = self._min_interval
+                self._nominal_times[car.finorvin] = self._hass.loop.time() + self._get_phase_offset(car.finorvin)
+                self._schedule_car(car, self._min_interval)
+
+    def async_stop(self):
+        """Stop the refresh schedule of all cars."""
+        self._running = False
+        for unsub in self._unsub_refresh.values():
+            unsub()
+        self._unsub_refresh.clear()
+
+    async def async_refresh_car(self, car):
+        """Refresh a single car and notify the entities of the changed attributes."""
+        if car.finorvin in self._refreshing:
+            LOGGER.debug("SmartEQ - Refresh of %s still running - skip", car.finorvin)
+            return None
+
+        self._refreshing.add(car.finorvin)
+        try:
+            changed = await self._client.update_car(car)
+        finally:
+            self._refreshing.discard(car.finorvin)
+
+        if changed:
+            car.publish_updates(changed)
+        return changed
+
+    def _get_phase_offset(self, vin: str) -> float:
+        return zlib.crc32(vin.encode()) / 2**32 * self._min_interval
+
+    def _schedule_car(self, car, interval: float):
+        now = self._hass.loop.time()
+        nominal_time = self._nominal_times.get(car.finorvin, now) + interval
+        if nominal_time < now:
+            # The last refresh took longer than the interval, restart the schedule from now
+            nominal_time = now
+        self._nominal_times[car.finorvin] = nominal_time
+
+        jitter = random.uniform(-POLL_JITTER_FRACTION, POLL_JITTER_FRACTION) * interval
+        delay = max(nominal_time + jitter - now, 0)
+
+        self._unsub_refresh[car.finorvin] = async_call_later(
+            self._hass, delay, partial(self._async_scheduled_refresh, car)
+        )
+
+    async def _async_scheduled_refresh(self, car, _now):
+        self._unsub_refresh.pop(car.finorvin, None)
+
+        try:
+            changed = await self.async_refresh_car(car)
+        except Exception:
+            # Keep the schedule of this car alive, the next poll may succeed
+            LOGGER.exception("SmartEQ - Refresh of %s failed", car.finorvin)
+            changed = None
+
+        interval = self._get_next_interval(car, changed)
+        self._intervals[car.finorvin] = interval
+        if self._running and car.finorvin not in self._unsub_refresh:
+            LOGGER.debug("SmartEQ - Next refresh of %s in %s seconds", car.finorvin, interval)
+            self._schedule_car(car, interval)
+
+    def _get_next_interval(self, car, changed) -> float:
+        if car.is_active or changed:
+            return self._min_interval
+
+        interval = self._intervals.get(car.finorvin, self._min_interval)
+        return min(interval * POLL_BACKOFF_FACTOR, self._max_interval)
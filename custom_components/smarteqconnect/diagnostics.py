@@ -0,0 +1,33 @@
+"""Diagnostics support for the smart EQ connect integration."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD, "token", "access_token", "refresh_token", "fin", "licensePlate"}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, config_entry: ConfigEntry) -> dict:
+    """Return the config entry and the last API exchanges."""
+    smarteq = hass.data.get(DOMAIN)
+    exchanges = smarteq.client.flight_recorder.entries if smarteq else []
+    vins = list(smarteq.client.cars) if smarteq else []
+
+    for index, vin in enumerate(vins):
+        exchanges = [_mask_vin(exchange, vin, f"VIN{index}") for exchange in exchanges]
+
+    return {
+        "entry": {
+            "data": async_redact_data(dict(config_entry.data), TO_REDACT),
+            "options": async_redact_data(dict(config_entry.options), TO_REDACT),
+        },
+        "exchanges": async_redact_data(exchanges, TO_REDACT),
+    }
+
+
+def _mask_vin(exchange: dict, vin: str, placeholder: str) -> dict:
+    exchange = dict(exchange)
+    exchange["url"] = exchange["url"].replace(vin, placeholder)
+    return exchange
@@ -17,3 +17,27 @@ class RequestError(MbapiError):
     """Define an error related to generic websocket errors."""
 
     pass
+
+
+class AuthenticationError(RequestError):
+    """Define an error for requests rejected with 401 or 403."""
+
+    pass
+
+
+class RateLimitError(RequestError):
+    """Define an error for requests rejected with 429."""
+
+    pass
+
+
+class ServerError(RequestError):
+    """Define an error for requests failing with a 5xx status."""
+
+    pass
+
+
+class ResponseError(RequestError):
+    """Define an error for response bodies that do not match the expected model."""
+
+    pass
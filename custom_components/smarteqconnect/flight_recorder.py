@@ -0,0 +1,210 @@
+"""Bounded in-memory recorder of the raw API exchanges.
+
+The recorder keeps the last exchanges with the API and the identity endpoints
+for the diagnostics download. Authorization headers, cookies and the bodies of
+the identity endpoints are redacted before an exchange is stored. The other
+bodies are only cut to FLIGHT_RECORDER_MAX_BODY_SIZE when stored and redacted
+when the entries are read. Optionally the exchanges are spilled to disk as
+rotated, gzip compressed JSON files, written in the executor.
+"""
+import asyncio
+import collections
+import gzip
+import json
+import logging
+import os
+import re
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .const import (
+    FLIGHT_RECORDER_MAX_BODY_SIZE,
+    FLIGHT_RECORDER_SIZE,
+    FLIGHT_RECORDER_SPILL_FILES,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+REDACTED = "**REDACTED**"
+REDACT_HEADERS = {"authorization", "cookie", "set-cookie"}
+REDACT_KEYS = {"access_token", "refresh_token", "id_token", "token", "code", "code_verifier", "password", "username"}
+# Exchanges with these paths carry credentials or tokens in their bodies
+IDENTITY_PATHS = ("/as/", "/ciam/")
+_REDACT_FORM_VALUES = re.compile(r"\b(" + "|".join(sorted(REDACT_KEYS)) + r")=[^&]*")
+
+
+def redact_headers(headers) -> dict:
+    if not headers:
+        return {}
+    return {key: REDACTED if key.lower() in REDACT_HEADERS else value for key, value in headers.items()}
+
+
+def redact_body(body, max_size: int = FLIGHT_RECORDER_MAX_BODY_SIZE):
+    """Return a JSON compatible, redacted and size limited copy of a request or response body."""
+    if body is None or body == b"" or body == "":
+        return None
+
+    if isinstance(body, (dict, list)):
+        return _redact_json(body)
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    elif not isinstance(body, str):
+        body = str(body)
+
+    try:
+        return _redact_json(json.loads(body))
+    except ValueError:
+        pass
+
+    body = _REDACT_FORM_VALUES.sub(lambda match: f"{match.group(1)}={REDACTED}", body)
+    if len(body) > max_size:
+        body = f"{body[:max_size]}... ({len(body) - max_size} characters truncated)"
+    return body
+
+
+def _redact_json(data):
+    if isinstance(data, dict):
+        return {key: REDACTED if key in REDACT_KEYS else _redact_json(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_redact_json(value) for value in data]
+    return data
+
+
+def _truncate(body, max_size: int = FLIGHT_RECORDER_MAX_BODY_SIZE):
+    if isinstance(body, (bytes, str)) and len(body) > max_size:
+        marker = f"... ({len(body) - max_size} characters truncated)"
+        return body[:max_size] + (marker.encode() if isinstance(body, bytes) else marker)
+    return body
+
+
+def _redact_entry(entry: tuple) -> dict:
+    timestamp, method, url, status, duration, request_headers, request_body, response_body, error = entry
+    return {
+        "time": timestamp,
+        "method": method,
+        "url": url,
+        "status": status,
+        "duration": duration,
+        "request_headers": request_headers,
+        "request_body": redact_body(request_body),
+        "response_body": redact_body(response_body),
+        "error": error,
+    }
+
+
+class ExchangeRecorder:
+    """A sink for the exchanges of API and Oauth, both pass every exchange to each of their recorders."""
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        status: Optional[int],
+        started: float,
+        request_headers=None,
+        request_body=None,
+        response_body=None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Store one exchange, started is the time.monotonic() of the request start."""
+        raise NotImplementedError
+
+    async def async_close(self) -> None:
+        """Write the exchanges not written yet and wait for running writes."""
+
+
+def record_exchange(recorders, method, url, status, started, request_headers, request_body, response_body, error=None):
+    for recorder in recorders:
+        recorder.record(method, url, status, started, request_headers, request_body, response_body, error)
+
+
+class FlightRecorder(ExchangeRecorder):
+    """Keep the last max_entries API exchanges in memory."""
+
+    def __init__(
+        self,
+        max_entries: int = FLIGHT_RECORDER_SIZE,
+        spill_path: Optional[str] = None,
+        spill_files: int = FLIGHT_RECORDER_SPILL_FILES,
+    ) -> None:
+        self._entries = collections.deque(maxlen=max_entries)
+        self._spill_path = spill_path
+        self._spill_files = spill_files
+        self._pending = 0
+        self._spill_tasks = set()
+
+    @property
+    def entries(self) -> list:
+        return [_redact_entry(entry) for entry in self._entries]
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        status: Optional[int],
+        started: float,
+        request_headers=None,
+        request_body=None,
+        response_body=None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Cut the bodies of the API to the size limit and store the exchange.
+
+        Those bodies are redacted only when the entries are read or spilled, so
+        recording a poll stays cheap on the event loop.
+        """
+        if urlsplit(url).path.startswith(IDENTITY_PATHS):
+            request_body, response_body = redact_body(request_body), redact_body(response_body)
+        else:
+            request_body, response_body = _truncate(request_body), _truncate(response_body)
+
+        self._entries.append(
+            (
+                time.time(),
+                method.upper(),
+                url,
+                status,
+                round(time.monotonic() - started, 4),
+                redact_headers(request_headers),
+                request_body,
+                response_body,
+                error,
+            )
+        )
+
+        if self._spill_path:
+            self._pending += 1
+            if self._pending >= self._entries.maxlen:
+                self._schedule_spill()
+
+    async def async_close(self) -> None:
+        if self._spill_path and self._pending:
+            self._schedule_spill()
+        if self._spill_tasks:
+            await asyncio.gather(*self._spill_tasks, return_exceptions=True)
+
+    def _schedule_spill(self) -> None:
+        entries = list(self._entries)[-self._pending :]
+        self._pending = 0
+
+        task = asyncio.get_running_loop().run_in_executor(None, self._spill, entries)
+        self._spill_tasks.add(task)
+        task.add_done_callback(self._spill_tasks.discard)
+
+    def _spill(self, entries: list) -> None:
+        try:
+            os.makedirs(self._spill_path, exist_ok=True)
+            filename = os.path.join(self._spill_path, f"exchanges-{int(time.time() * 1000)}.json.gz")
+            with gzip.open(filename, "wt", encoding="utf-8") as spill_file:
+                json.dump([_redact_entry(entry) for entry in entries], spill_file, default=str)
+
+            spilled = sorted(
+                name
+                for name in os.listdir(self._spill_path)
+                if name.startswith("exchanges-") and name.endswith(".json.gz")
+            )
+            for name in spilled[: -self._spill_files]:
+                os.remove(os.path.join(self._spill_path, name))
+        except OSError as err:
+            LOGGER.warning("Flight recorder - couldn't write to %s: %s", self._spill_path, err)
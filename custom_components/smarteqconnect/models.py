@@ -0,0 +1,184 @@
+"""Typed models of the smart EQ API responses.
+
+The models are plain dataclasses named after the JSON keys. When msgspec is
+installed the body is decoded straight into them, otherwise it is parsed with
+orjson or the standard library and converted by a converter that is compiled
+once per model. Both paths raise ResponseError on malformed payloads.
+"""
+import json
+import typing
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass
+from typing import Any, Dict, List, Optional, Type, TypeVar
+
+from .errors import ResponseError
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+T = TypeVar("T")
+
+
+@dataclass
+class DataSection:
+    """The options stay parsed JSON, Client._parse_car_detail only checks the mapped ones."""
+
+    data: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class RefreshData:
+    """Body of /seqc/v0/vehicles/{vin}/refresh-data."""
+
+    status: Optional[DataSection] = None
+    precond: Optional[DataSection] = None
+
+
+@dataclass
+class Baumuster:
+    baumusterDescription: Optional[str] = None
+
+
+@dataclass
+class SalesRelatedInformation:
+    baumuster: Baumuster = field(default_factory=Baumuster)
+
+
+@dataclass
+class VehicleData:
+    salesRelatedInformation: SalesRelatedInformation = field(default_factory=SalesRelatedInformation)
+
+
+@dataclass
+class InitData:
+    """Body of /seqc/v0/vehicles/{vin}/init-data."""
+
+    vehicleData: VehicleData = field(default_factory=VehicleData)
+
+
+@dataclass
+class Authorization:
+    fin: str
+    licensePlate: Optional[str] = None
+
+
+@dataclass
+class UserInfo:
+    """Body of /seqc/v0/users/current."""
+
+    authorizations: List[Authorization] = field(default_factory=list)
+
+
+_converters = {}
+
+
+def _get_converter(tp):
+    converter = _converters.get(tp)
+    if converter is None:
+        converter = _converters[tp] = _build_converter(tp)
+    return converter
+
+
+def _build_converter(tp):
+    """Build a function that validates and converts parsed JSON into tp."""
+    if tp is Any:
+        return lambda obj: obj
+
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+
+    if origin is typing.Union and type(None) in args:
+        inner = _get_converter(next(arg for arg in args if arg is not type(None)))
+        return lambda obj: None if obj is None else inner(obj)
+
+    if origin in (list, List):
+        item = _get_converter(args[0])
+
+        def convert_list(obj):
+            if not isinstance(obj, list):
+                raise ResponseError(f"Expected array, got {type(obj).__name__}")
+            return [item(value) for value in obj]
+
+        return convert_list
+
+    if origin in (dict, Dict):
+        item = _get_converter(args[1])
+
+        def convert_dict(obj):
+            if not isinstance(obj, dict):
+                raise ResponseError(f"Expected object, got {type(obj).__name__}")
+            return {key: item(value) for key, value in obj.items()}
+
+        return convert_dict
+
+    if is_dataclass(tp):
+        hints = typing.get_type_hints(tp)
+        plan = [
+            (
+                model_field.name,
+                model_field.default is MISSING and model_field.default_factory is MISSING,
+                _get_converter(hints[model_field.name]),
+            )
+            for model_field in fields(tp)
+        ]
+
+        def convert_dataclass(obj):
+            if not isinstance(obj, dict):
+                raise ResponseError(f"Expected object for {tp.__name__}, got {type(obj).__name__}")
+            kwargs = {}
+            for name, required, converter in plan:
+                if name in obj:
+                    kwargs[name] = converter(obj[name])
+                elif required:
+                    raise ResponseError(f"Object missing required field `{name}` for {tp.__name__}")
+            return tp(**kwargs)
+
+        return convert_dataclass
+
+    def convert_scalar(obj):
+        if not isinstance(obj, tp):
+            raise ResponseError(f"Expected {tp.__name__}, got {type(obj).__name__}")
+        return obj
+
+    return convert_scalar
+
+
+def _decode_with(loads):
+    def decode(payload: bytes, model: Type[T]) -> T:
+        try:
+            obj = loads(payload)
+        except ValueError as err:
+            raise ResponseError(f"Invalid JSON: {err}") from err
+        return _get_converter(model)(obj)
+
+    return decode
+
+
+DECODERS = {"json": _decode_with(json.loads)}
+
+if orjson is not None:
+    DECODERS["orjson"] = _decode_with(orjson.loads)
+
+if msgspec is not None:
+    _msgspec_decoders = {}
+
+    def _decode_msgspec(payload: bytes, model: Type[T]) -> T:
+        decoder = _msgspec_decoders.get(model)
+        if decoder is None:
+            decoder = _msgspec_decoders[model] = msgspec.json.Decoder(model)
+        try:
+            return decoder.decode(payload)
+        except (msgspec.DecodeError, msgspec.ValidationError) as err:
+            raise ResponseError(f"Invalid payload: {err}") from err
+
+    DECODERS["msgspec"] = _decode_msgspec
+
+# Fastest available backend
+JSON_BACKEND = next(backend for backend in ("msgspec", "orjson", "json") if backend in DECODERS)
+decode = DECODERS[JSON_BACKEND]
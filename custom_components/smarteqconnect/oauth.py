@@ -1,26 +1,33 @@
 """Define an object to interact with the REST API."""
+import asyncio
 import base64
 import hashlib
 import json
 import logging
+import os
+import tempfile
 import time
 import uuid
 from os import urandom
-from typing import Optional
+from typing import Optional, Sequence
 from urllib.parse import parse_qs, urlparse
 
 from aiohttp import ClientSession, ClientTimeout
 from aiohttp.client_exceptions import ClientError
 
 from .const import (
+    DEFAULT_TOKEN_RENEW_FRACTION,
     DEVICE_USER_AGENT,
     LOGIN_APP_ID_EU,
     LOGIN_BASE_URI,
     REGION_EUROPE,
     REST_API_BASE,
+    TOKEN_RENEW_MIN_DELAY,
+    TOKEN_RENEW_RETRY_DELAY,
     VERIFY_SSL,
 )
 from .errors import RequestError
+from .flight_recorder import ExchangeRecorder, record_exchange
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -34,6 +41,62 @@ PROXIES = {}
 # }
 
 
+class TokenStore:
+    """Keep the token in memory and persist it to the token cache file.
+
+    The cache file is only read once on startup and only written when the token
+    changes. Both run in the executor, writes go to a temp file which is then
+    renamed over the cache file so a crash never leaves a torn token behind.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None) -> None:
+        self._cache_path = cache_path
+        self._loaded = False
+        self._save_lock = asyncio.Lock()
+        self.token = None
+
+    async def async_load(self):
+        """Return the token, read it from the cache file on first use."""
+        if not self._loaded:
+            if self._cache_path:
+                self.token = await asyncio.get_running_loop().run_in_executor(None, self._load)
+            self._loaded = True
+        return self.token
+
+    async def async_save(self, token_info):
+        """Replace the token in memory and write it to the cache file."""
+        self.token = token_info
+        self._loaded = True
+        if self._cache_path:
+            async with self._save_lock:
+                await asyncio.get_running_loop().run_in_executor(None, self._save, token_info)
+
+    def _load(self):
+        _LOGGER.debug("start: TokenStore._load from %s", self._cache_path)
+        try:
+            with open(self._cache_path) as token_file:
+                return json.load(token_file)
+        except (IOError, ValueError):
+            return None
+
+    def _save(self, token_info):
+        _LOGGER.debug("start: TokenStore._save to %s", self._cache_path)
+        directory, filename = os.path.split(os.path.abspath(self._cache_path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{filename}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as token_file:
+                    token_file.write(json.dumps(token_info))
+                    token_file.flush()
+                    os.fsync(token_file.fileno())
+                os.replace(tmp_path, self._cache_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except IOError:
+            _LOGGER.warning("couldn't write token cache to %s", self._cache_path)
+
+
 class Oauth:  # pylint: disable-too-few-public-methods
     """define the client."""
 
@@ -45,13 +108,24 @@ class Oauth:  # pylint: disable-too-few-public-methods
         country_code: Optional[str] = "de-DE",
         cache_path: Optional[str] = None,
         region: str = None,
+        token_renew_fraction: float = DEFAULT_TOKEN_RENEW_FRACTION,
+        recorders: Sequence[ExchangeRecorder] = (),
+        login_base_uri: str = LOGIN_BASE_URI,
     ) -> None:
         self.token = None
         self._locale = locale
         self._country_code = country_code
         self._session: ClientSession = session
         self._region: str = region
+        self._recorders = recorders
+        self._login_base_uri = login_base_uri
         self.cache_path = cache_path
+        self._token_store = TokenStore(cache_path)
+        self._refresh_task: Optional[asyncio.Future] = None
+        self._token_renew_fraction = token_renew_fraction
+        self._renewal_active = False
+        self._renewal_handle: Optional[asyncio.TimerHandle] = None
+        self._renewal_task: Optional[asyncio.Future] = None
         self.code_verifier = self._random_string(64)
         self.code_challenge = self._generate_code_challenge(self.code_verifier)
         self.resume_url = ""
@@ -72,7 +146,7 @@ class Oauth:  # pylint: disable-too-few-public-methods
         # we need the cockies and the resume url
         async with self._session.request(
             "GET",
-            f"{ LOGIN_BASE_URI }/as/authorization.oauth2?client_id={ LOGIN_APP_ID_EU }&response_type=code&scope=openid+profile+email+phone+ciam-uid+offline_access&redirect_uri=https://oneapp.microservice.smart.mercedes-benz.com&code_challenge={ self.code_challenge }&code_challenge_method=S256",
+            f"{ self._login_base_uri }/as/authorization.oauth2?client_id={ LOGIN_APP_ID_EU }&response_type=code&scope=openid+profile+email+phone+ciam-uid+offline_access&redirect_uri=https://oneapp.microservice.smart.mercedes-benz.com&code_challenge={ self.code_challenge }&code_challenge_method=S256",
             headers=headers,
             proxy=SYSTEM_PROXY,
             verify_ssl=VERIFY_SSL,
@@ -86,11 +160,11 @@ class Oauth:  # pylint: disable-too-few-public-methods
         # Step 2: We switch to OTP mode
         headers["Accept"] = "application/json, text/plain, */*"
         headers["Content-Type"] = "application/json"
-        headers["Origin"] = LOGIN_BASE_URI
+        headers["Origin"] = self._login_base_uri
 
         async with self._session.request(
             "POST",
-            f"{ LOGIN_BASE_URI }/ciam/auth/login/user",
+            f"{ self._login_base_uri }/ciam/auth/login/user",
             data=f'{{"username":"{ email }"}}',
             headers=headers,
             proxy=SYSTEM_PROXY,
@@ -103,7 +177,7 @@ class Oauth:  # pylint: disable-too-few-public-methods
         # Step 3: We request the OTP
         async with self._session.request(
             "PUT",
-            f"{ LOGIN_BASE_URI }/ciam/auth/login/otp",
+            f"{ self._login_base_uri }/ciam/auth/login/otp",
             data=f'{{"username":"{ email }"}}',
             proxy=SYSTEM_PROXY,
             headers=headers,
@@ -112,14 +186,42 @@ class Oauth:  # pylint: disable-too-few-public-methods
             return await resp.json()
 
     async def async_refresh_access_token(self, refresh_token: str):
+        """Refresh the access token, concurrent callers share one in-flight refresh."""
+
+        current_token = self._token_store.token
+        if (
+            current_token is not None
+            and current_token.get("refresh_token") != refresh_token
+            and not self.is_token_expired(current_token)
+        ):
+            # Another refresh finished and rotated the refresh token meanwhile
+            _LOGGER.debug("refresh_access_token - token was refreshed already")
+            return current_token
+
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._async_refresh_access_token(refresh_token))
+            self._refresh_task.add_done_callback(self._refresh_task_done)
+        else:
+            _LOGGER.debug("refresh_access_token - join in-flight refresh")
+
+        return await asyncio.shield(self._refresh_task)
+
+    def _refresh_task_done(self, task: asyncio.Future):
+        self._refresh_task = None
+
+    async def _async_refresh_access_token(self, refresh_token: str):
         _LOGGER.info("start async refresh_access_token with refresh_token")
 
+        # Always post the newest refresh token we know, the caller may hold a rotated one
+        if self._token_store.token is not None:
+            refresh_token = self._token_store.token.get("refresh_token", refresh_token)
+
         # url = f"{LOGIN_BASE_URI if self._region == 'Europe' else LOGIN_BASE_URI_NA}/auth/realms/Daimler/protocol/openid-connect/token"
         # data = (
         #     f"client_id=app&grant_type=refresh_token&refresh_token={refresh_token}"
         # )
 
-        url = f"{LOGIN_BASE_URI}/as/token.oauth2"
+        url = f"{self._login_base_uri}/as/token.oauth2"
         data = f"client_id=70d89501-938c-4bec-82d0-6abb550b0825&grant_type=refresh_token&refresh_token={refresh_token}"
 
         headers = self._get_header()
@@ -134,8 +236,7 @@ class Oauth:  # pylint: disable-too-few-public-methods
             if "refresh_token" not in token_info:
                 token_info["refresh_token"] = refresh_token
             token_info = self._add_custom_values_to_token_info(token_info)
-            self._save_token_info(token_info)
-            self.token = token_info
+            await self._async_save_token_info(token_info)
 
         return token_info
 
@@ -154,11 +255,11 @@ class Oauth:  # pylint: disable-too-few-public-methods
         # Result: JSON, we need the token value
         headers["Accept"] = "application/json, text/plain, */*"
         headers["Content-Type"] = "application/json"
-        headers["Origin"] = LOGIN_BASE_URI
+        headers["Origin"] = self._login_base_uri
 
         async with self._session.request(
             "POST",
-            f"{ LOGIN_BASE_URI }/ciam/auth/login/otp",
+            f"{ self._login_base_uri }/ciam/auth/login/otp",
             data=f'{{"username":"{ email }", "password":"{ pin }","rememberMe":true}}',
             headers=headers,
             proxy=SYSTEM_PROXY,
@@ -176,7 +277,7 @@ class Oauth:  # pylint: disable-too-few-public-methods
 
         async with self._session.request(
             "POST",
-            f"{ LOGIN_BASE_URI }{ self.resume_url }",
+            f"{ self._login_base_uri }{ self.resume_url }",
             data="token=" + token,
             headers=headers,
             proxy=SYSTEM_PROXY,
@@ -190,7 +291,7 @@ class Oauth:  # pylint: disable-too-few-public-methods
         # Step 3: Holen des Bearer Tokens
         async with self._session.request(
             "POST",
-            f"{ LOGIN_BASE_URI }/as/token.oauth2",
+            f"{ self._login_base_uri }/as/token.oauth2",
             data="grant_type=authorization_code&code="
             + token
             + "&redirect_uri=https%3A%2F%2Foneapp.microservice.smart.mercedes-benz.com&code_verifier="
@@ -205,8 +306,7 @@ class Oauth:  # pylint: disable-too-few-public-methods
 
         if token_info is not None:
             token_info = self._add_custom_values_to_token_info(token_info)
-            self._save_token_info(token_info)
-            self.token = token_info
+            await self._async_save_token_info(token_info)
             return token_info
 
         return None
@@ -214,27 +314,96 @@ class Oauth:  # pylint: disable-too-few-public-methods
     async def async_get_cached_token(self):
         """Gets a cached auth token"""
         _LOGGER.debug("start: async_get_cached_token")
-        token_info = None
-        if self.cache_path:
-            try:
-                token_file = open(self.cache_path)
-                token_info_string = token_file.read()
-                token_file.close()
-                token_info = json.loads(token_info_string)
+        token_info = await self._token_store.async_load()
 
-                if self.is_token_expired(token_info):
-                    _LOGGER.debug("%s - token expired - start refresh", __name__)
-                    if "refresh_token" not in token_info:
-                        _LOGGER.warn("Refresh Token is missing - reauth required")
-                        return None
+        if token_info is not None and self.is_token_expired(token_info):
+            _LOGGER.debug("%s - token expired - start refresh", __name__)
+            if "refresh_token" not in token_info:
+                _LOGGER.warn("Refresh Token is missing - reauth required")
+                return None
 
-                    token_info = await self.async_refresh_access_token(token_info["refresh_token"])
+            token_info = await self.async_refresh_access_token(token_info["refresh_token"])
 
-            except IOError:
-                pass
         self.token = token_info
         return token_info
 
+    def start_token_renewal(self):
+        """Renew the access token in the background before it expires.
+
+        Polls then only read the cached token and never wait for a refresh.
+        """
+        self._renewal_active = True
+        self._schedule_token_renewal()
+
+    def stop_token_renewal(self):
+        """Stop the background renewal of the access token."""
+        self._renewal_active = False
+        if self._renewal_handle is not None:
+            self._renewal_handle.cancel()
+            self._renewal_handle = None
+        if self._renewal_task is not None:
+            self._renewal_task.cancel()
+            self._renewal_task = None
+
+    def _schedule_token_renewal(self, delay: Optional[float] = None):
+        if not self._renewal_active:
+            return
+
+        if self._renewal_handle is not None:
+            self._renewal_handle.cancel()
+            self._renewal_handle = None
+
+        if delay is None:
+            delay = self._get_token_renewal_delay(self._token_store.token)
+            if delay is None:
+                return
+
+        _LOGGER.debug("Token renewal scheduled in %s seconds", int(delay))
+        self._renewal_handle = asyncio.get_running_loop().call_later(delay, self._start_scheduled_renewal)
+
+    def _get_token_renewal_delay(self, token_info) -> Optional[float]:
+        """Seconds until the configured fraction of the token lifetime has passed."""
+        if token_info is None or "expires_in" not in token_info or "expires_at" not in token_info:
+            return None
+
+        expires_in = token_info["expires_in"]
+        # The remaining lifetime can never be longer than the lifetime itself, this
+        # clamps tokens from a cache file written with a clock running ahead.
+        remaining = min(max(token_info["expires_at"] - time.time(), 0), expires_in)
+        delay = remaining - (1 - self._token_renew_fraction) * expires_in
+
+        return max(delay, TOKEN_RENEW_MIN_DELAY)
+
+    def _start_scheduled_renewal(self):
+        self._renewal_handle = None
+        self._renewal_task = asyncio.ensure_future(self._async_renew_token())
+
+    async def _async_renew_token(self):
+        token_info = self._token_store.token
+        if token_info is None or "refresh_token" not in token_info:
+            _LOGGER.warning("Token renewal - Refresh Token is missing - reauth required")
+            return
+
+        token_info = await self.async_refresh_access_token(token_info["refresh_token"])
+        self._renewal_task = None
+
+        if token_info is None:
+            _LOGGER.warning("Token renewal failed, retry in %s seconds", TOKEN_RENEW_RETRY_DELAY)
+            self._schedule_token_renewal(TOKEN_RENEW_RETRY_DELAY)
+        else:
+            self._schedule_token_renewal()
+
+    def invalidate_token(self, token_info):
+        """Mark a token rejected by the API as expired.
+
+        The next async_get_cached_token call refreshes it. Nothing happens if the
+        token was replaced by a refresh in the meantime.
+        """
+        current_token = self._token_store.token
+        if current_token is not None and current_token.get("access_token") == token_info.get("access_token"):
+            _LOGGER.debug("Access token rejected by the API - invalidate")
+            current_token["expires_at"] = 0
+
     def is_token_expired(self, token_info):
         if token_info is not None:
             now = int(time.time())
@@ -242,15 +411,11 @@ class Oauth:  # pylint: disable-too-few-public-methods
 
         return True
 
-    def _save_token_info(self, token_info):
-        _LOGGER.debug("start: _save_token_info to %s", self.cache_path)
-        if self.cache_path:
-            try:
-                token_file = open(self.cache_path, "w")
-                token_file.write(json.dumps(token_info))
-                token_file.close()
-            except IOError:
-                _LOGGER.warning("couldn't write token cache to %s", self.cache_path)
+    async def _async_save_token_info(self, token_info):
+        _LOGGER.debug("start: _async_save_token_info to %s", self.cache_path)
+        self.token = token_info
+        await self._token_store.async_save(token_info)
+        self._schedule_token_renewal()
 
     def _add_custom_values_to_token_info(self, token_info):
         """
@@ -300,22 +465,21 @@ class Oauth:  # pylint: disable-too-few-public-methods
         kwargs.setdefault("headers", {})
         kwargs.setdefault("proxy", SYSTEM_PROXY)
         kwargs.setdefault("verify_ssl", VERIFY_SSL)
+        kwargs.setdefault("timeout", ClientTimeout(total=DEFAULT_TIMEOUT))
 
-        use_running_session = self._session and not self._session.closed
-
-        if use_running_session:
-            session = self._session
-        else:
-            session = ClientSession(timeout=ClientTimeout(total=DEFAULT_TIMEOUT))
+        if self._session is None or self._session.closed:
+            _LOGGER.error("Error requesting data from %s: session is closed", url)
+            return None
 
+        started = time.monotonic()
         try:
-            async with session.request(method, url, data=data, **kwargs) as resp:
+            async with self._session.request(method, url, data=data, **kwargs) as resp:
+                body = await resp.read()
+                record_exchange(self._recorders, method, url, resp.status, started, kwargs["headers"], data, body)
                 resp.raise_for_status()
-                return await resp.json(content_type=None)
+                return json.loads(body) if body else None
         except ClientError as err:
+            record_exchange(self._recorders, method, url, None, started, kwargs["headers"], data, None, f"{err!r}")
             _LOGGER.error(f"Error requesting data from {url}: {err}")
         except Exception as e:
             _LOGGER.error(f"Error requesting data from {url}: {e}")
-        finally:
-            if not use_running_session:
-                await session.close()
@@ -3,6 +3,7 @@ import logging
 from homeassistant.helpers.restore_state import RestoreEntity
 
 from . import SmartEQEntity
+from .car import RetrievalStatus
 from .const import DOMAIN, SENSORS
 
 LOGGER = logging.getLogger(__name__)
@@ -18,16 +19,16 @@ async def async_setup_entry(hass, entry, async_add_entities):
         return
 
     sensor_list = []
-    for car in data.client.cars:
+    for car in data.client.cars.values():
 
         for key, value in sorted(SENSORS.items()):
             if value[5] is None or getattr(car.features, value[5], False) is True:
                 device = SmartEQSensor(hass=hass, data=data, internal_name=key, sensor_config=value, vin=car.finorvin)
-                if device.device_retrieval_status() in [0, "VALID", "NOT_RECEIVED"]:
+                if device.device_retrieval_status() in (RetrievalStatus.VALID, RetrievalStatus.NOT_RECEIVED):
                     sensor_list.append(device)
                     LOGGER.debug("Sensor added: %s", key)
 
-    async_add_entities(sensor_list, True)
+    async_add_entities(sensor_list)
 
 
 class SmartEQSensor(SmartEQEntity, RestoreEntity):
@@ -37,8 +38,8 @@ class SmartEQSensor(SmartEQEntity, RestoreEntity):
     def state(self):
         """Return the state of the sensor."""
 
-        if self.device_retrieval_status == "NOT_RECEIVED":
-            return "NOT_RECEIVED"
+        if self._retrievalstatus is RetrievalStatus.NOT_RECEIVED:
+            return RetrievalStatus.NOT_RECEIVED.name
 
         return self._state
 
@@ -47,6 +48,7 @@ class SmartEQSensor(SmartEQEntity, RestoreEntity):
         await super().async_added_to_hass()
         # __init__ will set self._state to self._initial, only override
         # if needed.
-        state = await self.async_get_last_state()
-        if state is not None:
-            self._state = state.state
+        if self._state is None:
+            state = await self.async_get_last_state()
+            if state is not None:
+                self._state = state.state